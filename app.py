@@ -11,6 +11,9 @@ from dash_extensions.enrich import (
     Serverside,
     callback)
 from backend.openmlfetcher import fetch_flows, fetch_suites
+from backend.fanovaservice import (configure_celery, configure_result_cache,
+                                   RedisLRUCache)
+import os
 import sys
 
 
@@ -25,13 +28,10 @@ if deploy:
     from redis import StrictRedis
     from redis.exceptions import ConnectionError
 
-    # Redis configuration
-    host = "localhost"
-    port = 6379
-    db = 0
+    # Redis configuration, shared by the app and all Celery workers
+    redis_url = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
     cache_expiry = 24 * 60 * 60  # cache for 24 hours
 
-    redis_url = "redis://" + host + ":" + str(port) + "/" + str(db)
     redis_inst = StrictRedis.from_url(redis_url)
 
     # Check if the Redis backend is active
@@ -46,16 +46,26 @@ if deploy:
     manager = CeleryManager(celery_app, cache_by=(lambda: 0))
     rb = manager.handle.backend.expires = cache_expiry
 
+    # Spread fanova over the Celery workers, passing data through Redis
+    configure_celery(celery_app, redis_inst, cache_expiry)
+
+    # Share the fanova results of identical fits between all users
+    configure_result_cache(RedisLRUCache(redis_inst, expiry=cache_expiry))
+
     # Configure the redis backend for Serverside Output Transform
     backend = DashRedisBackend(
         default_timeout=cache_expiry+5,
-        host=host, port=port, db=db
+        host=redis_inst
         )
 else:
     from dash_extensions.enrich import FileSystemBackend
     from diskcache import Cache
 
     cache = Cache("./cache")
+    # cache the fanova results of identical fits, up to 256MB
+    configure_result_cache(Cache("./fanova_cache",
+                                 size_limit=256 * 1024 ** 2,
+                                 eviction_policy="least-recently-used"))
     manager = DiskcacheManager(cache, cache_by=(lambda: 0), expire=3600)
     backend = FileSystemBackend()
 
@@ -131,7 +141,6 @@ app.layout = html.Div([
 )
 def load_flows_suites(id):
     options_df = fetch_flows()
-    options_df["id_str"] = options_df.index.astype(str)
 
     suites_df = fetch_suites()
 
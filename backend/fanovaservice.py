@@ -1,3 +1,17 @@
+import json
+import logging
+import os
+import sys
+from hashlib import sha256
+from inspect import signature
+from io import BytesIO
+from itertools import chain, islice
+from multiprocessing import current_process, get_context
+from time import perf_counter, sleep, time
+from contextlib import contextmanager
+from typing import Any, Callable, Generator, Iterable, Iterator
+from uuid import uuid4
+
 import numpy as np
 import pandas as pd
 
@@ -7,20 +21,180 @@ from ConfigSpace import Constant
 from ConfigSpace import CategoricalHyperparameter, OrdinalHyperparameter
 from ConfigSpace.hyperparameters import NumericalHyperparameter
 from ConfigSpace.hyperparameters.hp_components import ROUND_PLACES
+from threadpoolctl import threadpool_limits
+
+from backend.forestanova import NumpyANOVA
+
+
+logger = logging.getLogger(__name__)
+
+# The parameters of the random forest fANOVA fits, as presets. max_rows
+# is the maximum amount of runs of a task used for the fit, 0 uses all.
+# The quick preset gives a preview of the importances in a fraction of
+# the time, see benchmarks/fanova_presets.py for its accuracy.
+FOREST_PRESETS: dict[str, dict[str, int]] = {
+    'full': {'n_trees': 16, 'max_depth': 64, 'min_samples_split': 0,
+             'min_samples_leaf': 0, 'max_rows': 0},
+    'quick': {'n_trees': 8, 'max_depth': 64, 'min_samples_split': 0,
+              'min_samples_leaf': 5, 'max_rows': 2000},
+}
+
+# The column with the amount of runs a deduplicated row stands for
+COUNT_COLUMN = ':count'
+
+# The amount of values a QuantileSketch keeps exactly
+SKETCH_SIZE = 4096
+
+# The ways runs of a task can be subsampled, see subsample
+SAMPLING_METHODS = ('stratified', 'random')
+
+# The amount of extra hyperparameters whose pairs are computed, on top
+# of the most important ones needed for the requested amount of pairs
+PAIR_CANDIDATE_MARGIN = 2
+
+# The default maximum amount of three-way interactions evaluated per task
+TRIPLET_EVALUATIONS = 20
+
+# The default amount of bootstrap replicates of a task, how often their
+# confidence intervals are checked, and how little the bounds should
+# change between checks to stop early
+BOOTSTRAP_REPLICATES = 100
+BOOTSTRAP_STEP = 10
+BOOTSTRAP_TOLERANCE = 0.01
+
+# The suffix of the names of the variances between seeds in the results
+VARIANCE_SUFFIX = ':variance'
+
+# The maximum amount of fANOVA results cached in Redis
+RESULT_CACHE_ENTRIES = 100000
 
+# The Celery queue the fANOVA tasks are sent to, and how often the
+# progress of a group is checked in seconds. Workers consuming this queue
+# should not also run the background callbacks that wait on the group.
+FANOVA_QUEUE = 'fanova'
+POLL_INTERVAL = 0.5
 
-def auto_configspace(data: dict[int, pd.DataFrame]) -> ConfigurationSpace:
+# Set by configure_celery, when the app runs with Celery and Redis
+_celery_app: Any = None
+_redis: Any = None
+_expiry = 24 * 60 * 60
+_run_stored_fanova: Any = None
+
+# Set by configure_result_cache
+_result_cache: Any = None
+
+# The threads of a pool worker process, set by _limit_threads
+_threads: int | None = None
+
+
+def auto_configspace(data: dict[int, pd.DataFrame],
+                     stats: dict[int, dict[str, dict[str, Any]]]
+                     | None = None) -> ConfigurationSpace:
     """Create a configuration space to fit all hyperparameter setups in
     data, which should still contain the irrelevant 'value' column. The
     resulting configuration space will be as small as possible, will not
     contain NA values, and parameters that are NA in all data will not
-    appear in the configuration space at all.
+    appear in the configuration space at all. The tasks are summarised
+    one at a time, see summarise_columns, or stats of data_stats are
+    used if specified.
+    """
+    if stats is None:
+        task_stats = (column_stats(task_data) for task_data in data.values())
+    else:
+        task_stats = (stats[task] for task in data.keys())
+    return summary_configspace(summarise_columns(task_stats), data)
+
+
+def data_stats(data: dict[int, pd.DataFrame]
+               ) -> dict[int, dict[str, dict[str, Any]]]:
+    """The column_stats of every task in data, which can be computed once
+    when the data is fetched or filtered, and passed to auto_configspace
+    and impute_data instead of scanning the data again.
     """
-    if len(data) == 0:
-        return ConfigurationSpace()
+    return {task: column_stats(task_data) for task, task_data in data.items()}
+
+
+def column_stats(task_data: pd.DataFrame) -> dict[str, dict[str, Any]]:
+    """Summarise the hyperparameter columns of one task: the kind of their
+    values ('int', 'float' or 'other'), whether their dtype is nullable,
+    the amount of runs with and without a value, and the minimum and
+    maximum of numeric columns or the unique values of other columns. All
+    values are Python objects, so the statistics can be stored as JSON.
+    """
+    stats = {}
+
+    for name, column in task_data.items():
+        if name == 'value':
+            continue
+
+        count = int(column.count())
+        col: dict[str, Any] = {
+            'kind': 'other', 'tasks': 1, 'count': count,
+            'nulls': len(column) - count,
+            'nullable': isinstance(column.dtype,
+                                   pd.api.extensions.ExtensionDtype)}
+        if (pd.api.types.is_bool_dtype(column)
+                or not pd.api.types.is_numeric_dtype(column)):
+            col['unique'] = column.dropna().unique().tolist()
+        else:
+            col['kind'] = ('int' if pd.api.types.is_integer_dtype(column)
+                           else 'float')
+            if col['count'] > 0:
+                # ConfigSpace does not recognise all numpy dtypes
+                col['min'] = column.min().item()
+                col['max'] = column.max().item()
+        stats[str(name)] = col
 
-    full_data = pd.concat(data)
+    return stats
 
+
+def summarise_columns(task_stats: Iterable[dict[str, dict[str, Any]]]
+                      ) -> dict[str, Any]:
+    """Fold the column_stats of many tasks into one summary in a single
+    pass, which holds the amount of tasks and the merged statistics of
+    every column. Columns that are numeric in some tasks and not in
+    others get the kind 'mixed'.
+    """
+    columns: dict[str, dict[str, Any]] = {}
+    n_tasks = 0
+
+    for stats in task_stats:
+        n_tasks += 1
+        for name, col in stats.items():
+            merged = columns.get(name)
+            if merged is None:
+                columns[name] = {**col, 'unique': list(col.get('unique', []))}
+                continue
+
+            merged['tasks'] += col['tasks']
+            merged['count'] += col['count']
+            merged['nulls'] += col['nulls']
+            merged['nullable'] &= col['nullable']
+            merged['unique'] = list(dict.fromkeys(
+                chain(merged['unique'], col.get('unique', []))))
+            if 'min' in col:
+                merged['min'] = min(merged.get('min', col['min']),
+                                    col['min'])
+                merged['max'] = max(merged.get('max', col['max']),
+                                    col['max'])
+
+            kinds = {merged['kind'], col['kind']}
+            if len(kinds) > 1:
+                merged['kind'] = ('float' if kinds == {'int', 'float'}
+                                  else 'mixed')
+
+    return {'tasks': n_tasks, 'columns': columns}
+
+
+def summary_configspace(summary: dict[str, Any],
+                        data: dict[int, pd.DataFrame] | None = None
+                        ) -> ConfigurationSpace:
+    """Create the configuration space of auto_configspace from a summary
+    of summarise_columns. Like a concatenation of the tasks would, integer
+    columns missing from some tasks become floats, unless their dtype is
+    nullable. The unique values of 'mixed' columns are not in the
+    summary, so these are collected from data, which is then required.
+    """
     param_dict: dict[str,
                      tuple[int, int]
                      | tuple[float, float]
@@ -29,69 +203,167 @@ def auto_configspace(data: dict[int, pd.DataFrame]) -> ConfigurationSpace:
                      | float
                      | str] = {}
 
-    params_data = full_data.drop(columns=['value'], errors='ignore')
-    params_data = params_data.dropna(axis=1, how='all')
-    num_cols = params_data.select_dtypes(include=['number']).columns
-    cat_cols = params_data.select_dtypes(exclude=['number']).columns
-
-    # Min and max of numerical hyperparams
-    for col in num_cols:
-        min_val = params_data[col].min()
-        max_val = params_data[col].max()
-        if min_val == max_val:
-            param_dict[col] = min_val
-        else:
-            param_dict[col] = (min_val, max_val)
+    for name, col in summary['columns'].items():
+        if col['count'] == 0:
+            continue
 
-    # Unique values of categorical hyperparams
-    for col in cat_cols:
-        unique_values = list(params_data[col].dropna().unique())
-        if len(unique_values) == 1:
-            param_dict[col] = unique_values[0]
+        kind = col['kind']
+        if (kind == 'int' and col['tasks'] < summary['tasks']
+                and not col['nullable']):
+            kind = 'float'
+
+        if kind == 'mixed':
+            if data is None:
+                raise ValueError(f'The values of {name} are needed, as it '
+                                 'is not numeric in all tasks')
+            unique = list(dict.fromkeys(chain.from_iterable(
+                task_data[name].dropna().unique().tolist()
+                for task_data in data.values() if name in task_data)))
+        elif kind == 'other':
+            unique = col['unique']
         else:
-            param_dict[col] = unique_values
+            low, high = col['min'], col['max']
+            if kind == 'float':
+                low, high = float(low), float(high)
+            param_dict[name] = low if low == high else (low, high)
+            continue
+
+        param_dict[name] = unique[0] if len(unique) == 1 else unique
 
     return ConfigurationSpace(space=param_dict)
 
 
 def filter_data(data: dict[int, pd.DataFrame],
-                cfg_space: ConfigurationSpace) -> dict[int, pd.DataFrame]:
+                cfg_space: ConfigurationSpace,
+                masks: dict[str, tuple[tuple, dict[int, np.ndarray]]]
+                | None = None) -> dict[int, pd.DataFrame]:
     """Filters data according to the configuration space cfg_space, and
     returns the data that fits. Columns in data not present as parameter
     in cfg_space are ignored, and NA values are always accepted. If a parameter
     is omitted from the cfg_space, all values are accepted for that parameter.
+    Tasks of which all runs fit are returned as is, without a copy. See
+    filter_masks for masks.
     """
+    index = filter_index(data, filter_masks(data, cfg_space, masks))
+    return {task: df if len(index[task]) == len(df) else df.iloc[index[task]]
+            for task, df in data.items()}
+
+
+def filter_masks(data: dict[int, pd.DataFrame],
+                 cfg_space: ConfigurationSpace,
+                 masks: dict[str, tuple[tuple, dict[int, np.ndarray]]]
+                 | None = None
+                 ) -> dict[str, tuple[tuple, dict[int, np.ndarray]]]:
+    """For every parameter of cfg_space, the condition it puts on the runs
+    in data and a boolean array per task of the runs that meet it. The
+    masks of a previous call on the same data can be passed as masks, so
+    only the parameters whose condition changed are evaluated again.
+    """
+    masks = masks or {}
     result = {}
 
-    for task, df in data.items():
-        valid = {}
+    for param_name, param in cfg_space.items():
+        condition = _filter_condition(param)
+        if condition is None:
+            continue
 
-        for param_name, param in cfg_space.items():
-            if isinstance(param, Constant):
-                valid[param_name] = df[param_name].isna() \
-                                    | (df[param_name] == param.value)
-            elif isinstance(param, CategoricalHyperparameter):
-                valid[param_name] = df[param_name].isna() \
-                                    | df[param_name].isin(param.choices)
-            elif isinstance(param, NumericalHyperparameter):
-                valid[param_name] = df[param_name].isna() \
-                                    | ((df[param_name] >= param.lower)
-                                       & (df[param_name] <= param.upper))
-
-        result[task] = df[pd.DataFrame.from_dict(valid).all(axis=1)]
+        previous = masks.get(param_name)
+        if (previous is not None and previous[0] == condition
+                and all(len(previous[1].get(task, ())) == len(df)
+                        for task, df in data.items())):
+            result[param_name] = previous
+            continue
+
+        result[param_name] = (condition,
+                              {task: _filter_mask(df, param_name, condition)
+                               for task, df in data.items()})
 
     return result
 
 
+def filter_index(data: dict[int, pd.DataFrame],
+                 masks: dict[str, tuple[tuple, dict[int, np.ndarray]]]
+                 ) -> dict[int, np.ndarray]:
+    """The positions of the runs of every task in data that meet all
+    conditions in masks of filter_masks.
+    """
+    return {task: np.flatnonzero(_combine_masks(masks, task, len(df)))
+            for task, df in data.items()}
+
+
+def filter_counts(data: dict[int, pd.DataFrame],
+                  masks: dict[str, tuple[tuple, dict[int, np.ndarray]]]
+                  ) -> dict[int, int]:
+    """The amount of runs of every task in data that meet all conditions
+    in masks of filter_masks, without selecting them.
+    """
+    return {task: int(np.count_nonzero(_combine_masks(masks, task,
+                                                      len(df))))
+            for task, df in data.items()}
+
+
+def _combine_masks(masks: dict[str, tuple[tuple, dict[int, np.ndarray]]],
+                   task: int, n_runs: int) -> np.ndarray:
+    valid = np.ones(n_runs, dtype=bool)
+    for _, task_masks in masks.values():
+        valid &= task_masks[task]
+    return valid
+
+
+def _filter_condition(param: Any) -> tuple | None:
+    if isinstance(param, Constant):
+        return ('in', (param.value,))
+    if isinstance(param, CategoricalHyperparameter):
+        return ('in', tuple(param.choices))
+    if isinstance(param, NumericalHyperparameter):
+        return ('range', param.lower, param.upper)
+    return None
+
+
+def _filter_mask(df: pd.DataFrame, param_name: str,
+                 condition: tuple) -> np.ndarray:
+    """The boolean array of the runs of df that meet condition of
+    _filter_condition on param_name, or have no value for it.
+    """
+    if param_name not in df.columns:
+        return np.ones(len(df), dtype=bool)
+    column = df[param_name]
+
+    # categories are compared once, and looked up by their codes
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy()
+        if condition[0] == 'in':
+            allowed = column.cat.categories.isin(condition[1])
+        else:
+            categories = pd.to_numeric(column.cat.categories,
+                                       errors='coerce')
+            allowed = ~(categories < condition[1]) & ~(categories >
+                                                       condition[2])
+        return (codes < 0) | np.append(allowed, False)[codes]
+
+    if condition[0] == 'range' and pd.api.types.is_numeric_dtype(column):
+        # comparisons with NaN are false, so missing values are accepted
+        values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+        return ~(values < condition[1]) & ~(values > condition[2])
+
+    if condition[0] == 'range':
+        valid = (column >= condition[1]) & (column <= condition[2])
+    else:
+        valid = column.isin(condition[1])
+    return (column.isna() | valid).to_numpy(dtype=bool, na_value=False)
+
+
 def impute_data(data: dict[int, pd.DataFrame],
-                cfg_space: ConfigurationSpace) \
+                cfg_space: ConfigurationSpace,
+                stats: dict[int, dict[str, dict[str, Any]]] | None = None) \
         -> tuple[dict[int, pd.DataFrame], ConfigurationSpace]:
     """Imputes the data with a value out of range. The range is specified
     by cfg_space, and we return the imputed data, as well as an extended
     configuration space that includes the imputed values. Columns containing
     only missing values are removed. Constant columns with missing values
     become categorical, while those without missing values are discarded
-    from the data.
+    from the data. If specified, the stats of data_stats tell which
+    columns have missing values.
     """
     # The values to impute with
     impute_vals: dict[str, int | float | str] = {}
@@ -107,9 +379,12 @@ def impute_data(data: dict[int, pd.DataFrame],
 
     for param_name, param in cfg_space.items():
         # If a parameter has no missing values, skip it
-        incomplete = False
-        for task_data in data.values():
-            incomplete |= task_data[param_name].isna().any()
+        if stats is not None:
+            incomplete = any(stats[task][param_name]['nulls'] > 0
+                             for task in data.keys())
+        else:
+            incomplete = any(task_data[param_name].isna().any()
+                             for task_data in data.values())
 
         # Constant params become categorical by adding an impute value
         # Truly constant ones are no longer relevant
@@ -150,8 +425,15 @@ def impute_data(data: dict[int, pd.DataFrame],
     imputed_cfg = ConfigurationSpace(cfg_dict)
 
     for task, task_data in data.items():
-        imputed_data[task] = \
-            task_data[['value'] + list(imputed_cfg.keys())].fillna(impute_vals)
+        task_data = task_data[['value'] + list(imputed_cfg.keys())]
+        # Categorical columns need the impute value as extra category
+        for param_name, val in impute_vals.items():
+            col = task_data[param_name]
+            if (isinstance(col.dtype, pd.CategoricalDtype)
+                    and val not in col.cat.categories):
+                task_data = task_data.assign(
+                    **{param_name: col.cat.add_categories([val])})
+        imputed_data[task] = task_data.fillna(impute_vals)
 
     return imputed_data, imputed_cfg
 
@@ -166,21 +448,28 @@ def bin_numeric(data: dict[int, pd.DataFrame],
     bins contain roughly the same amount of values, automatically taking
     non-uniform distributions into account. In the returned configuration
     space all numerical hyperparameters are replaced by ordinal ones.
+
+    The bin edges come from a QuantileSketch of every task, merged over
+    the tasks, so the data is never concatenated. The frames in data are
+    not changed: the returned frames share their other columns, and hold
+    the bins as uint8 codes.
     """
     res = {}
 
     num = [p_name for p_name in cfg_space.keys()
            if isinstance(cfg_space[p_name], NumericalHyperparameter)]
 
-    all_data = pd.concat([task_data[num] for task_data in data.values()])
     bounds = {}
     ordinal_params = []
 
     for p_name in num:
-        n_bins = min(128, max_bins, all_data[p_name].nunique())
-        sorted = np.sort(all_data[p_name])
-        bounds_index = np.linspace(0, len(sorted)-1, n_bins)[1:].astype('int')
-        bounds[p_name] = sorted[bounds_index]
+        sketch = QuantileSketch()
+        for task_data in data.values():
+            sketch = sketch.merge(QuantileSketch(task_data[p_name]))
+
+        n_bins = min(128, max_bins, sketch.nunique)
+        ranks = np.linspace(0, sketch.total - 1, n_bins)[1:].astype('int')
+        bounds[p_name] = sketch.rank_values(ranks)
         ordinal_params.append(OrdinalHyperparameter(p_name,
                                                     range(n_bins),
                                                     default_value=n_bins//2))
@@ -191,14 +480,75 @@ def bin_numeric(data: dict[int, pd.DataFrame],
     cfg_space.add(ordinal_params)
 
     for task, task_data in data.items():
+        # a shallow copy, so replacing columns leaves the original intact
+        task_data = task_data.copy(deep=False)
         for p_name, boundaries in bounds.items():
-            task_data[p_name] = np.digitize(task_data[p_name], boundaries)
+            task_data[p_name] = np.digitize(task_data[p_name],
+                                            boundaries).astype(np.uint8)
 
         res[task] = task_data
 
     return res, cfg_space
 
 
+class QuantileSketch:
+    """A mergeable summary of the distribution of numeric values, used to
+    find quantiles over many tasks without concatenating them. It holds
+    the sorted unique values with their counts, as long as there are at
+    most SKETCH_SIZE of them. Beyond that, it keeps SKETCH_SIZE evenly
+    spaced quantiles, each weighing an equal share of the values, and
+    the quantiles found are then accurate to about 1 / SKETCH_SIZE of
+    the ranks. Missing values are left out.
+    """
+
+    def __init__(self, values: Any = None):
+        if values is None:
+            values = np.array([], dtype=np.float64)
+        values = pd.Series(values).dropna().to_numpy(dtype=np.float64)
+        self.values, counts = np.unique(values, return_counts=True)
+        self.weights = counts.astype(np.float64)
+        self.exact = True
+        self._compress()
+
+    @property
+    def total(self) -> int:
+        """The amount of values summarised."""
+        return int(round(self.weights.sum()))
+
+    @property
+    def nunique(self) -> int:
+        """The amount of unique values, which is only exact if it is at
+        most SKETCH_SIZE.
+        """
+        return len(self.values) if self.exact else SKETCH_SIZE + 1
+
+    def merge(self, other: 'QuantileSketch') -> 'QuantileSketch':
+        """A new sketch of the values of both sketches."""
+        result = QuantileSketch()
+        values = np.concatenate([self.values, other.values])
+        weights = np.concatenate([self.weights, other.weights])
+        result.values, inverse = np.unique(values, return_inverse=True)
+        result.weights = np.bincount(inverse, weights=weights)
+        result.exact = self.exact and other.exact
+        result._compress()
+        return result
+
+    def rank_values(self, ranks: np.ndarray) -> np.ndarray:
+        """The values at the (0-based) ranks in the sorted values."""
+        cumulative = np.cumsum(self.weights)
+        index = np.searchsorted(cumulative, ranks, side='right')
+        return self.values[np.minimum(index, len(self.values) - 1)]
+
+    def _compress(self) -> None:
+        if len(self.values) <= SKETCH_SIZE:
+            return
+        total = self.weights.sum()
+        ranks = (np.arange(SKETCH_SIZE) + 0.5) * total / SKETCH_SIZE
+        self.values = self.rank_values(ranks)
+        self.weights = np.full(SKETCH_SIZE, total / SKETCH_SIZE)
+        self.exact = False
+
+
 def prepare_data(data: dict[int, pd.DataFrame],
                  cfg_space: ConfigurationSpace) -> dict[int, pd.DataFrame]:
     """Prepares the data for fANOVA. This includes rounding numeric data
@@ -212,8 +562,8 @@ def prepare_data(data: dict[int, pd.DataFrame],
         for param_name, param in cfg_space.items():
             if isinstance(param, CategoricalHyperparameter):
                 task_data[param_name] = \
-                    task_data[param_name].map((lambda option:
-                                               param.choices.index(option)))
+                    pd.Categorical(task_data[param_name],
+                                   categories=list(param.choices)).codes
             elif isinstance(param, Constant):
                 task_data[param_name] = 0
 
@@ -223,36 +573,721 @@ def prepare_data(data: dict[int, pd.DataFrame],
     return res
 
 
+def deduplicate(task_data: pd.DataFrame) -> pd.DataFrame:
+    """Collapse the runs of one task with the exact same setup into one
+    row, with their mean value and their amount of runs in COUNT_COLUMN.
+    Rows that were deduplicated before count with their weight.
+    """
+    params = [name for name in task_data.columns
+              if name not in ('value', COUNT_COLUMN)]
+    counts = (task_data[COUNT_COLUMN] if COUNT_COLUMN in task_data.columns
+              else pd.Series(1, index=task_data.index))
+    totals = pd.DataFrame({'value': task_data['value'] * counts,
+                           COUNT_COLUMN: counts})
+
+    if len(params) == 0:
+        totals = totals.sum().to_frame().T
+    else:
+        totals = totals.groupby([task_data[name] for name in params],
+                                sort=False, dropna=False).sum()
+    totals['value'] /= totals[COUNT_COLUMN]
+    return totals.reset_index(drop=len(params) == 0)
+
+
+def subsample(task_data: pd.DataFrame, max_rows: int,
+              method: str = 'stratified',
+              seed: int | None = None) -> pd.DataFrame:
+    """Return at most max_rows runs of one task, or all if max_rows is 0.
+    A stratified sample splits the runs ordered by value into max_rows
+    blocks of (almost) the same size and draws one run from each, so the
+    whole range of values is represented. A random sample draws them
+    uniformly. The runs of deduplicated setups (see deduplicate) are
+    sampled as runs, and every drawn setup keeps the amount of its runs
+    that was drawn in COUNT_COLUMN.
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f'Unknown sampling method {method}')
+    if COUNT_COLUMN in task_data.columns:
+        return _subsample_runs(task_data, max_rows, method, seed)
+    if max_rows <= 0 or len(task_data) <= max_rows:
+        return task_data
+    if method == 'random':
+        return task_data.sample(n=max_rows, random_state=seed)
+
+    rng = np.random.default_rng(seed)
+    order = np.argsort(task_data['value'].to_numpy(), kind='stable')
+    edges = np.linspace(0, len(task_data), max_rows + 1).astype(np.int64)
+    picks = edges[:-1] + (rng.random(max_rows) *
+                          np.diff(edges)).astype(np.int64)
+    return task_data.iloc[np.sort(order[picks])]
+
+
+def _subsample_runs(task_data: pd.DataFrame, max_rows: int, method: str,
+                    seed: int | None) -> pd.DataFrame:
+    counts = task_data[COUNT_COLUMN].to_numpy(np.int64)
+    total = int(counts.sum())
+    if max_rows <= 0 or total <= max_rows:
+        return task_data
+
+    # runs are numbered setup by setup, in order of value for a
+    # stratified sample, and the drawn numbers are mapped to their setups
+    rng = np.random.default_rng(seed)
+    order: np.ndarray = np.arange(len(task_data))
+    if method == 'random':
+        runs = rng.choice(total, max_rows, replace=False)
+    else:
+        order = np.argsort(task_data['value'].to_numpy(), kind='stable')
+        edges = np.linspace(0, total, max_rows + 1).astype(np.int64)
+        runs = edges[:-1] + (rng.random(max_rows) *
+                             np.diff(edges)).astype(np.int64)
+    ends = np.cumsum(counts[order])
+    drawn = np.bincount(order[np.searchsorted(ends, runs, side='right')],
+                        minlength=len(task_data))
+
+    sample = task_data.iloc[np.flatnonzero(drawn)].copy()
+    sample[COUNT_COLUMN] = drawn[drawn > 0]
+    return sample
+
+
+def reduce_data(data: dict[int, pd.DataFrame],
+                max_rows: int = 0,
+                method: str = 'stratified',
+                seed: int | None = None) -> dict[int, pd.DataFrame]:
+    """Reduce the prepared data of every task before running fANOVA, by
+    collapsing duplicate setups (see deduplicate) and keeping at most
+    max_rows of the remaining rows (see subsample). Should be run after
+    the data is restricted to the analysed hyperparameters, as that can
+    make more setups the same. run_fanova weights every setup by its
+    amount of runs, so the importances stay those of the runs.
+    """
+    res = {}
+
+    for task, task_data in data.items():
+        reduced = deduplicate(task_data)
+        res[task] = subsample(reduced, max_rows, method, seed)
+        if len(reduced) < len(task_data):
+            logger.info('Task %d: %d of %d runs have a unique setup',
+                        task, len(reduced), len(task_data))
+
+    return res
+
+
+def forest_params(preset: str = 'full', **params: int) -> dict[str, int]:
+    """Return the forest parameters of the preset in FOREST_PRESETS, with
+    the parameters given as keyword arguments replacing those of the
+    preset. Arguments that are None keep the value of the preset.
+    """
+    result = dict(FOREST_PRESETS[preset])
+    for name, value in params.items():
+        if name not in result:
+            raise ValueError(f'Unknown forest parameter {name}')
+        if value is not None:
+            result[name] = value
+    return result
+
+
+# The fANOVA implementations run_fanova can use, by name
+ENGINES: dict[str, type] = {'pyrfr': fANOVA, 'numpy': NumpyANOVA}
+
+
+def pair_candidates(n_pairs: int, n_params: int) -> int:
+    """The amount of most important hyperparameters (out of n_params) whose
+    pairs are computed, to find the n_pairs most important pairs. This is
+    the smallest amount with n_pairs pairs, plus PAIR_CANDIDATE_MARGIN.
+    """
+    k = 2
+    while k*(k-1) // 2 < n_pairs:
+        k += 1
+    return min(n_params, k + PAIR_CANDIDATE_MARGIN)
+
+
 def run_fanova(task_data: pd.DataFrame,
                cfg_space: ConfigurationSpace,
-               n_pairs: int = 0) -> dict[str, float] | None:
+               n_pairs: int = 0,
+               forest: dict[str, int] | None = None,
+               seed: int | None = None,
+               prune_pairs: bool = True,
+               n_triplets: int = 0,
+               triplet_evaluations: int = TRIPLET_EVALUATIONS,
+               triplet_seconds: float = 0,
+               sampling: str = 'stratified',
+               engine: str = 'pyrfr') -> dict[str, float] | None:
     """Run fANOVA on data for one task, which contains imputed and prepared
     setups and evals that fit in the configuration space cfg_space. If the
     task does not have at least min_runs runs, return None. Returns a dict
-    with relative importance indexed by parameter name.
+    with relative importance indexed by parameter name. The random forest
+    is fit with the parameters in forest (see forest_params, by default
+    the full preset), and on at most max_rows runs sampled from the task
+    with the sampling method (see subsample). seed makes both the sampling
+    and the forest reproducible. The rows of deduplicated data (see
+    reduce_data) are weighted by their COUNT_COLUMN, other columns that
+    are not in cfg_space are not used. engine is the name of the fANOVA
+    implementation in ENGINES.
+
+    The n_pairs most important pairwise marginals are added as well. If
+    prune_pairs, only pairs of the pair_candidates most individually
+    important hyperparameters are considered, instead of all pairs.
+
+    The n_triplets most important three-way interactions found are added
+    too, see triplet_importance for the search and its budget.
     """
+    if engine not in ENGINES:
+        raise ValueError(f'Unknown fANOVA engine {engine}')
     if len(task_data) <= 0:
         return None
 
-    X = task_data.drop(columns=['value'])
+    forest = {**FOREST_PRESETS['full'], **(forest or {})}
+    task_data = subsample(task_data, forest['max_rows'], sampling, seed)
+
+    X = task_data[list(cfg_space.keys())]
     Y = task_data.value.to_numpy()
 
-    fnv = fANOVA(X, Y, config_space=cfg_space)
+    # the NumPy engine uses the threads given to a pool worker
+    options: dict[str, Any] = {}
+    if engine == 'numpy':
+        options['n_jobs'] = _threads
+
+    # a deduplicated setup weighs as much as its sampled runs, the pyrfr
+    # forest takes no weights so its setups are repeated instead, which
+    # gives it at most max_rows rows as well
+    if COUNT_COLUMN in task_data.columns:
+        counts = task_data[COUNT_COLUMN].to_numpy(np.int64)
+        if engine == 'numpy':
+            options['sample_weight'] = counts
+        else:
+            X = X.iloc[np.repeat(np.arange(len(X)), counts)]
+            Y = np.repeat(Y, counts)
+
+    fnv = ENGINES[engine](X, Y, config_space=cfg_space,
+                          n_trees=forest['n_trees'],
+                          max_depth=forest['max_depth'],
+                          min_samples_split=forest['min_samples_split'],
+                          min_samples_leaf=forest['min_samples_leaf'],
+                          seed=seed, **options)
 
     result = {}
+    names = list(cfg_space.keys())
 
-    for index, param_name in enumerate(cfg_space.keys()):
+    for index, param_name in enumerate(names):
         score = fnv.quantify_importance((index,))[(index,)]
         result[param_name] = score['individual importance']
 
-    if n_pairs > 0:
-        pairs = fnv.get_most_important_pairwise_marginals(n=n_pairs)
+    # the triplet search is guided by the pairs, so it needs them as well
+    pairs: dict[tuple[str, str], float] = {}
+    if (n_pairs > 0 or n_triplets > 0) and len(cfg_space) >= 2:
+        n = len(cfg_space)
+        candidates = list(range(n))
+        if prune_pairs:
+            # the pairs are named in the order of the configspace, so
+            # that the same pair has the same name on every task
+            candidates.sort(key=(lambda i: result[names[i]]), reverse=True)
+            candidates = sorted(candidates[:pair_candidates(max(n_pairs,
+                                                                n_triplets),
+                                                            n)])
+
+        k = len(candidates)
+        logger.info('Computing %d of %d pairwise marginals (%.0f%% saved)',
+                    k*(k-1) // 2, n*(n-1) // 2,
+                    100 - 100 * (k*(k-1)) / (n*(n-1)))
+
+        # with params specified, fanova returns all their pairs in order
+        pairs = dict(fnv.get_most_important_pairwise_marginals(
+            params=candidates))
         result.update({name[0]+'_-_'+name[1]: importance
-                       for name, importance in pairs.items()})
+                       for name, importance
+                       in islice(pairs.items(), n_pairs)})
+
+    if n_triplets > 0 and len(cfg_space) >= 3:
+        triplets = triplet_importance(fnv, cfg_space, result, pairs,
+                                      n_triplets, triplet_evaluations,
+                                      triplet_seconds)
+        result.update({'_-_'.join(name): importance
+                       for name, importance in triplets.items()})
 
     return result
 
 
+def triplet_importance(fnv: fANOVA | NumpyANOVA,
+                       cfg_space: ConfigurationSpace,
+                       individual: dict[str, float],
+                       pairs: dict[tuple[str, str], float],
+                       n_triplets: int,
+                       evaluations: int = TRIPLET_EVALUATIONS,
+                       seconds: float = 0
+                       ) -> dict[tuple[str, str, str], float]:
+    """Search the most important three-way interactions in the fitted
+    fANOVA model fnv, given the individual importances and pairwise
+    marginals found in it. Triplets are evaluated most promising first,
+    which are the triplets that extend the most important pairs with the
+    most important third hyperparameter. The search stops after
+    evaluations triplets, or after seconds seconds if that is not 0.
+    Returns the n_triplets most important triplets found, by name.
+    """
+    names = list(cfg_space.keys())
+    index = {name: i for i, name in enumerate(names)}
+
+    def pair(a: str, b: str) -> float:
+        return pairs.get((a, b), pairs.get((b, a), 0))
+
+    scores: dict[tuple[str, ...], float] = {}
+    for a, b in pairs:
+        for c in names:
+            if c != a and c != b:
+                triplet = tuple(sorted((a, b, c), key=index.__getitem__))
+                scores[triplet] = (pairs[(a, b)] + individual[c]
+                                   + pair(a, c) + pair(b, c))
+
+    found = {}
+    deadline = perf_counter() + seconds
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+    for triplet in ranked[:evaluations]:
+        if seconds > 0 and perf_counter() > deadline:
+            break
+        dims = tuple(index[name] for name in triplet)
+        score = fnv.quantify_importance(dims)[dims]
+        found[triplet] = score['individual importance']
+
+    logger.info('Evaluated %d of %d candidate triplets', len(found),
+                len(scores))
+    best = sorted(found, key=found.__getitem__, reverse=True)[:n_triplets]
+    return {(a, b, c): found[(a, b, c)] for a, b, c in best}
+
+
+def run_fanova_tasks(data: dict[int, pd.DataFrame],
+                     cfg_space: ConfigurationSpace,
+                     n_workers: int | None = None,
+                     progress: Callable[[int, int], None] | None = None,
+                     n_seeds: int = 1,
+                     **fit_args: Any
+                     ) -> dict[int, dict[str, float] | None]:
+    """Run fANOVA on the prepared data of every task, see run_fanova, in
+    a pool of n_workers processes (by default one per core). fit_args are
+    passed on to run_fanova. If n_seeds is more than one, every task is
+    fit with that many seeds, see combine_seeds. The threads of every
+    worker are limited so together they use each core once. progress is
+    called with the amount of finished and total tasks every time a task
+    finishes. Returns the results in the order of data.
+    """
+    results = {}
+    for i, (task, result) in enumerate(
+            iter_fanova_tasks(data, cfg_space, n_workers, n_seeds,
+                              **fit_args), start=1):
+        results[task] = result
+        if progress is not None:
+            progress(i, len(data))
+    return {task: results[task] for task in data}
+
+
+def iter_fanova_tasks(data: dict[int, pd.DataFrame],
+                      cfg_space: ConfigurationSpace,
+                      n_workers: int | None = None,
+                      n_seeds: int = 1,
+                      **fit_args: Any
+                      ) -> Iterator[tuple[int, dict[str, float] | None]]:
+    """Like run_fanova_tasks, but yields (task, result) pairs in the order
+    the tasks finish, starting with the results in the result cache. The
+    pool is terminated when the iterator is closed. Cancelling a
+    background callback kills its process together with the workers of
+    its pool. Daemonic processes (like Celery workers) can not start a
+    pool, so they run the tasks one by one.
+    """
+    units = _seed_units(data, n_seeds, fit_args)
+    keys, cached = _cached_results(units, cfg_space, n_seeds, fit_args)
+    uncached = {unit: units[unit] for unit in units if unit not in cached}
+
+    seeds: dict[int, list[dict[str, float] | None]] = {}
+    for unit, result in chain(cached.items(),
+                              _iter_fanova_pool(uncached.items(),
+                                                len(uncached), cfg_space,
+                                                n_workers)):
+        if unit not in cached:
+            _cache_result(keys.get(unit), result)
+        seeds.setdefault(unit[0], []).append(result)
+        if len(seeds[unit[0]]) == max(n_seeds, 1):
+            yield unit[0], combine_seeds(seeds.pop(unit[0]))
+
+
+def combine_seeds(results: list[dict[str, float] | None]
+                  ) -> dict[str, float] | None:
+    """Combine the results of fitting one task with several seeds into
+    their mean importances, followed by the variance of every importance
+    between the seeds, named with VARIANCE_SUFFIX. A single result is
+    returned as is.
+    """
+    results = [result for result in results if result is not None]
+    if len(results) <= 1:
+        return results[0] if results else None
+
+    # interactions missing for a seed were not among its most important
+    frame = pd.DataFrame(results).fillna(0)
+    return {**frame.mean().to_dict(),
+            **frame.var().add_suffix(VARIANCE_SUFFIX).to_dict()}
+
+
+def _seed_units(data: dict[int, pd.DataFrame],
+                n_seeds: int,
+                fit_args: dict[str, Any]
+                ) -> dict[tuple[int, int], tuple[pd.DataFrame,
+                                                 dict[str, Any]]]:
+    # every unit of work is one fit of a task, with its own seed
+    if n_seeds <= 1:
+        return {(task, 0): (task_data, fit_args)
+                for task, task_data in data.items()}
+
+    seed = fit_args.get('seed')
+    if seed is None:
+        seed = int(np.random.randint(2 ** 31 - n_seeds))
+    return {(task, i): (task_data, {**fit_args, 'seed': seed + i})
+            for task, task_data in data.items() for i in range(n_seeds)}
+
+
+def _iter_fanova_pool(units: Iterable[tuple[tuple[int, int],
+                                            tuple[pd.DataFrame,
+                                                  dict[str, Any]]]],
+                      n_units: int,
+                      cfg_space: ConfigurationSpace,
+                      n_workers: int | None
+                      ) -> Generator[tuple[tuple[int, int],
+                                           dict[str, float] | None],
+                                     None, None]:
+    # units may be generated lazily, the pool takes them as workers
+    # become free, so only a few of them exist at the same time
+    n_workers = min(n_workers or os.cpu_count() or 1, n_units)
+    if n_workers <= 1 or current_process().daemon:
+        for unit, (task_data, fit_args) in units:
+            yield unit, run_fanova(task_data, cfg_space, **fit_args)
+        return
+
+    threads = max(1, (os.cpu_count() or 1) // n_workers)
+    with _without_main():
+        pool = get_context('spawn').Pool(n_workers, _limit_threads,
+                                         (threads,))
+    with pool:
+        yield from pool.imap_unordered(
+            _run_fanova_task,
+            ((unit, task_data, cfg_space, fit_args)
+             for unit, (task_data, fit_args) in units))
+
+
+@contextmanager
+def _without_main() -> Iterator[None]:
+    """Hide the main module from the processes spawned meanwhile. Spawned
+    processes run the main module of their parent again, which for the
+    app builds the whole Dash app with all its pages. Pool workers only
+    need the backend, which they import with their tasks.
+    """
+    main = sys.modules['__main__']
+    hidden: dict[str, Any] = {'__spec__': getattr(main, '__spec__', None)}
+    if hasattr(main, '__file__'):
+        hidden['__file__'] = main.__file__
+        del main.__file__
+    main.__spec__ = None
+    try:
+        yield
+    finally:
+        main.__dict__.update(hidden)
+
+
+def bootstrap_fanova(task_data: pd.DataFrame,
+                     cfg_space: ConfigurationSpace,
+                     n_boot: int = BOOTSTRAP_REPLICATES,
+                     confidence: float = 0.95,
+                     tolerance: float = BOOTSTRAP_TOLERANCE,
+                     n_workers: int | None = None,
+                     seed: int | None = None,
+                     **fit_args: Any) -> pd.DataFrame:
+    """Estimate confidence intervals of the importances of one task, by
+    running fANOVA (see run_fanova, which gets fit_args) on n_boot
+    bootstrap resamples of the runs in its prepared data, in a pool of
+    n_workers processes. Deduplicated setups (see reduce_data) are drawn
+    in proportion to their runs. Every BOOTSTRAP_STEP replicates (or every
+    n_workers, if larger), the intervals are compared to the previous
+    ones, and the remaining replicates are cancelled once no bound moved
+    more than tolerance. Returns a frame indexed by importance name, with
+    the mean, lower and upper bound of the confidence interval. Its attrs
+    contain the amount of replicates used.
+    """
+    # the resamples are drawn as they are fit, so stopping early also
+    # saves drawing and keeping the remaining ones
+    rng = np.random.default_rng(seed)
+    samples = (((0, b), (_resample(task_data, rng), fit_args))
+               for b in range(n_boot))
+    step = max(n_workers or os.cpu_count() or 1, BOOTSTRAP_STEP)
+
+    results = []
+    intervals = None
+    replicates = _iter_fanova_pool(samples, n_boot, cfg_space, n_workers)
+    try:
+        for _, result in replicates:
+            if result is None:
+                continue
+            results.append(result)
+            if len(results) % step == 0:
+                new = _bootstrap_intervals(results, confidence)
+                if (intervals is not None and
+                        (new[['lower', 'upper']] -
+                         intervals[['lower', 'upper']])
+                        .abs().max().max() <= tolerance):
+                    break
+                intervals = new
+    finally:
+        replicates.close()
+
+    return _bootstrap_intervals(results, confidence)
+
+
+def _resample(task_data: pd.DataFrame,
+              rng: np.random.Generator) -> pd.DataFrame:
+    if COUNT_COLUMN not in task_data.columns:
+        return task_data.iloc[rng.integers(len(task_data),
+                                           size=len(task_data))]
+
+    # draw the runs of deduplicated setups, and keep the drawn setups
+    # with the amount of their runs that was drawn
+    counts = task_data[COUNT_COLUMN].to_numpy(np.int64)
+    draws = rng.multinomial(counts.sum(), counts / counts.sum())
+    sample = task_data[draws > 0].copy()
+    sample[COUNT_COLUMN] = draws[draws > 0]
+    return sample
+
+
+def _bootstrap_intervals(results: list[dict[str, float]],
+                         confidence: float) -> pd.DataFrame:
+    # interactions missing in a replicate were not among its most important
+    frame = pd.DataFrame(results).fillna(0)
+    alpha = (1 - confidence) / 2
+    intervals = pd.DataFrame({'mean': frame.mean(),
+                              'lower': frame.quantile(alpha),
+                              'upper': frame.quantile(1 - alpha)})
+    intervals.attrs['replicates'] = len(results)
+    return intervals
+
+
+def _run_fanova_task(args: tuple[tuple[int, int], pd.DataFrame,
+                                 ConfigurationSpace, dict[str, Any]]
+                     ) -> tuple[tuple[int, int], dict[str, float] | None]:
+    return args[0], run_fanova(args[1], args[2], **args[3])
+
+
+def _limit_threads(threads: int) -> None:
+    global _threads
+    _threads = threads
+    threadpool_limits(threads)
+
+
+def configure_celery(celery_app: Any, redis: Any,
+                     expiry: int = 24 * 60 * 60) -> None:
+    """Register the fANOVA task with celery_app, and store the data of
+    every task in the redis client redis for at most expiry seconds.
+    The prefork children of a worker share its cores, see
+    _share_worker_cores. Until this is called, celery_enabled() is False.
+    """
+    from celery.signals import worker_init
+
+    global _celery_app, _redis, _expiry, _run_stored_fanova
+    _celery_app, _redis, _expiry = celery_app, redis, expiry
+    _run_stored_fanova = celery_app.task(name='hpiad.run_stored_fanova')(
+        _run_fanova_reference)
+    worker_init.connect(_share_worker_cores, weak=False)
+
+
+def _share_worker_cores(sender: Any = None, **kwargs: Any) -> None:
+    # Runs in a starting worker, before its prefork children are forked
+    # and inherit the limit, so all children together use every core once
+    concurrency = getattr(sender, 'concurrency', None) or os.cpu_count()
+    _limit_threads(max(1, (os.cpu_count() or 1) // (concurrency or 1)))
+
+
+def celery_enabled() -> bool:
+    """Whether fANOVA can be run on the Celery workers."""
+    return _celery_app is not None
+
+
+def run_fanova_group(data: dict[int, pd.DataFrame],
+                     cfg_space: ConfigurationSpace,
+                     progress: Callable[[int, int], None] | None = None,
+                     n_seeds: int = 1,
+                     **fit_args: Any
+                     ) -> dict[int, dict[str, float] | None]:
+    """Run fANOVA on the prepared data of every task, see run_fanova_tasks,
+    as one Celery group, so the fits are spread over all workers consuming
+    FANOVA_QUEUE. The data is stored in Redis and passed to the workers by
+    its key. progress is called with the amount of finished and total
+    fits while waiting. Returns the results in the order of data. If
+    waiting is interrupted, the remaining fits are revoked.
+    """
+    from celery import group
+
+    units = _seed_units(data, n_seeds, fit_args)
+    keys, results = _cached_results(units, cfg_space, n_seeds, fit_args)
+    uncached = [unit for unit in units if unit not in results]
+
+    if len(uncached) > 0:
+        prefix = f'hpiad:fanova:{uuid4().hex}'
+        data_keys = {task: f'{prefix}:{task}'
+                     for task in {unit[0] for unit in uncached}}
+        with _redis.pipeline() as pipe:
+            for task, key in data_keys.items():
+                pipe.set(key, data[task].to_parquet(), ex=_expiry)
+            pipe.execute()
+
+        space = cfg_space.to_serialized_dict()
+        result = group(_run_stored_fanova.s(data_keys[unit[0]], space,
+                                            units[unit][1])
+                       for unit in uncached).apply_async(queue=FANOVA_QUEUE)
+        try:
+            while not result.ready():
+                if progress is not None:
+                    progress(len(results) + result.completed_count(),
+                             len(units))
+                sleep(POLL_INTERVAL)
+
+            # the background callback waiting here is a Celery task itself
+            for unit, unit_result in zip(uncached, result.get(
+                    disable_sync_subtasks=False)):
+                _cache_result(keys.get(unit), unit_result)
+                results[unit] = unit_result
+        finally:
+            if not result.ready():
+                result.revoke(terminate=True)
+            _redis.delete(*data_keys.values())
+
+    if progress is not None:
+        progress(len(units), len(units))
+    return {task: combine_seeds([results[(task, i)]
+                                 for i in range(max(n_seeds, 1))])
+            for task in data}
+
+
+def _run_fanova_reference(key: str, space: dict,
+                          fit_args: dict[str, Any]
+                          ) -> dict[str, float] | None:
+    task_data = pd.read_parquet(BytesIO(_redis.get(key)))
+    return run_fanova(task_data,
+                      ConfigurationSpace.from_serialized_dict(space),
+                      **fit_args)
+
+
+def configure_result_cache(cache: Any) -> None:
+    """Cache the results of run_fanova_tasks and run_fanova_group in cache,
+    which should have the get and set methods of a diskcache Cache (like
+    RedisLRUCache). Results are cached by fanova_key, so identical fits
+    are shared by all users. Until this is called, nothing is cached.
+    """
+    global _result_cache
+    _result_cache = cache
+
+
+class RedisLRUCache:
+    """A cache of strings in Redis with the get and set methods of a
+    diskcache Cache. It keeps at most max_entries entries for at most
+    expiry seconds, and removes the least recently used entries first.
+    """
+
+    def __init__(self, redis: Any, prefix: str = 'hpiad:results',
+                 max_entries: int = RESULT_CACHE_ENTRIES,
+                 expiry: int = 24 * 60 * 60) -> None:
+        self.redis = redis
+        self.prefix = prefix
+        self.max_entries = max_entries
+        self.expiry = expiry
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.redis.get(f'{self.prefix}:{key}')
+        if value is None:
+            return default
+        self.redis.zadd(f'{self.prefix}:lru', {key: time()})
+        return value.decode()
+
+    def set(self, key: str, value: str) -> None:
+        lru = f'{self.prefix}:lru'
+        with self.redis.pipeline() as pipe:
+            pipe.set(f'{self.prefix}:{key}', value, ex=self.expiry)
+            pipe.zadd(lru, {key: time()})
+            pipe.zcard(lru)
+            size = pipe.execute()[-1]
+
+        if size > self.max_entries:
+            evicted = self.redis.zpopmin(lru, size - self.max_entries)
+            self.redis.delete(*(f'{self.prefix}:{old.decode()}'
+                                for old, _ in evicted))
+
+
+def fanova_key(task_data: pd.DataFrame,
+               cfg_space: ConfigurationSpace,
+               **fit_args: Any) -> str:
+    """A fingerprint of all arguments of run_fanova, which is the same
+    only if the result of the fit is the same (up to its randomness).
+    """
+    args = signature(run_fanova).bind(task_data, cfg_space, **fit_args)
+    args.apply_defaults()
+    fit_args = dict(args.arguments)
+    del fit_args['task_data'], fit_args['cfg_space']
+    fit_args['forest'] = {**FOREST_PRESETS['full'],
+                          **(fit_args['forest'] or {})}
+
+    digest = sha256(pd.util.hash_pandas_object(task_data, index=False)
+                    .to_numpy().tobytes())
+    digest.update(json.dumps([list(task_data.columns),
+                              [str(dtype) for dtype in task_data.dtypes],
+                              cfg_space.to_serialized_dict(),
+                              fit_args],
+                             sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _cached_results(units: dict[tuple[int, int],
+                                tuple[pd.DataFrame, dict[str, Any]]],
+                    cfg_space: ConfigurationSpace,
+                    n_seeds: int,
+                    fit_args: dict[str, Any]
+                    ) -> tuple[dict[tuple[int, int], str],
+                               dict[tuple[int, int], dict[str, float]]]:
+    # the seeds drawn at random by _seed_units can not be asked for again,
+    # so their results are neither looked up nor stored
+    if _result_cache is None or (n_seeds > 1 and
+                                 fit_args.get('seed') is None):
+        return {}, {}
+
+    keys = {unit: fanova_key(task_data, cfg_space, **fit_args)
+            for unit, (task_data, fit_args) in units.items()}
+    cached = {unit: _result_cache.get(key) for unit, key in keys.items()}
+    return keys, {unit: json.loads(result)
+                  for unit, result in cached.items() if result is not None}
+
+
+def _cache_result(key: str | None, result: dict[str, float] | None) -> None:
+    if _result_cache is not None and key is not None and result is not None:
+        _result_cache.set(key, json.dumps(result))
+
+
+def analyse_task(task_data: pd.DataFrame,
+                 filter_space: ConfigurationSpace | None = None,
+                 min_runs: int = 0) -> dict[str, float] | None:
+    """Run the whole analysis on the (type coerced) data of one task on
+    its own, so it can start as soon as that task is fetched. The data is
+    filtered on filter_space if specified, imputed and prepared, and
+    fANOVA is run on all hyperparameters that are not constant in this
+    task. Returns None if fewer than min_runs runs remain, or if there
+    are no such hyperparameters.
+    """
+    data = {0: task_data}
+    if filter_space is not None:
+        data = filter_data(data, filter_space)
+
+    imputed_data, cfg_space = impute_data(data, auto_configspace(data))
+    if len(cfg_space) == 0:
+        return None
+
+    prepared = prepare_data(imputed_data, cfg_space)[0]
+    if len(prepared) < min_runs:
+        return None
+
+    # a single task does not need a pool, but can be in the result cache
+    return run_fanova_tasks(reduce_data({0: prepared}), cfg_space,
+                            n_workers=1)[0]
+
+
 def export_csv(flow_id: int,
                suite_id: int,
                results: pd.DataFrame) -> None:  # pragma: no cover
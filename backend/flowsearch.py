@@ -0,0 +1,125 @@
+from re import split
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+
+# The minimum length of a search token, and the amount of flows returned
+# for a search. Tokens shorter than MIN_TOKEN_LENGTH are ignored.
+MIN_TOKEN_LENGTH = 3
+MAX_RESULTS = 100
+
+# The index of the last searched flow catalog, shared by all sessions
+_index: 'FlowIndex | None' = None
+_index_lock = Lock()
+
+
+class FlowIndex:
+    """Trigram index over the names and IDs of a flow catalog, as returned
+    by fetch_flows. Flows are stored in rank order: shorter names first,
+    and newer flows first among names of the same length, so the first
+    matches found are also the best ones.
+    """
+
+    def __init__(self, flows: pd.DataFrame) -> None:
+        names = flows['full_name'].astype(str)
+        order = np.lexsort((-flows.index.to_numpy(), names.str.len()))
+        self.fingerprint = catalog_fingerprint(flows)
+        self.ids = flows.index.to_numpy()[order]
+        self.names = names.to_numpy()[order]
+        self.lower_names = [name.lower() for name in self.names]
+        self.id_strs = [str(id) for id in self.ids]
+        self.positions = {int(id): i for i, id in enumerate(self.ids)}
+        self.name_grams = _trigram_index(self.lower_names)
+        self.id_grams = _trigram_index(self.id_strs)
+
+    def search(self, query: str,
+               limit: int = MAX_RESULTS) -> list[tuple[int, str]]:
+        """Return the (id, name) pairs of at most limit flows that contain
+        every search token in query. Numeric tokens are matched against
+        the flow ID, others case-insensitively against the name. An exact
+        ID match is always ranked first. Returns an empty list if the
+        query has no tokens of at least MIN_TOKEN_LENGTH characters.
+        """
+        tokens = [token.lower() for token in split('[ .]', query)
+                  if len(token) >= MIN_TOKEN_LENGTH]
+        if not tokens:
+            return []
+
+        # only the rarest trigram of every token is used to find candidates,
+        # since the candidates are verified anyway
+        postings = []
+        for token in tokens:
+            grams = self.id_grams if token.isnumeric() else self.name_grams
+            if any(gram not in grams for gram in _trigrams(token)):
+                return []
+            postings.append(min((grams[gram] for gram in _trigrams(token)),
+                                key=len))
+        postings.sort(key=len)
+
+        candidates = postings[0]
+        member = np.zeros(len(self.ids), dtype=bool)
+        for posting in postings[1:]:
+            member[posting] = True
+            candidates = candidates[member[candidates]]
+            member[posting] = False
+
+        # verify the candidates in rank order, until we have enough
+        id_tokens = [token for token in tokens if token.isnumeric()]
+        name_tokens = [token for token in tokens if not token.isnumeric()]
+
+        def matches(i: int) -> bool:
+            return (all(token in self.id_strs[i] for token in id_tokens) and
+                    all(token in self.lower_names[i] for token in name_tokens))
+
+        first = [self.positions[int(token)] for token in id_tokens
+                 if int(token) in self.positions]
+        results = [i for i in first if matches(i)]
+        for i in candidates.tolist():
+            if len(results) >= limit:
+                break
+            if i not in first and matches(i):
+                results.append(i)
+
+        return [(int(self.ids[i]), self.names[i]) for i in results[:limit]]
+
+
+def catalog_fingerprint(flows: pd.DataFrame) -> tuple[int, int, int]:
+    """A cheap fingerprint of a flow catalog that changes whenever flows
+    are added to or removed from it.
+    """
+    if flows.empty:
+        return (0, 0, 0)
+    return (len(flows), int(flows.index.min()), int(flows.index.max()))
+
+
+def flow_index(flows: pd.DataFrame) -> FlowIndex:
+    """Return the index of the flow catalog flows. The index is only
+    built again if the catalog has changed since the previous call.
+    """
+    global _index
+    fingerprint = catalog_fingerprint(flows)
+    with _index_lock:
+        if _index is None or _index.fingerprint != fingerprint:
+            _index = FlowIndex(flows)
+        return _index
+
+
+def search_flows(flows: pd.DataFrame, query: str,
+                 limit: int = MAX_RESULTS) -> list[tuple[int, str]]:
+    """Search the flow catalog flows, see FlowIndex.search."""
+    return flow_index(flows).search(query, limit)
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i+3] for i in range(len(text) - 2)}
+
+
+def _trigram_index(texts: list[str]) -> dict[str, np.ndarray]:
+    postings: dict[str, list[int]] = {}
+    for i, text in enumerate(texts):
+        for gram in _trigrams(text):
+            postings.setdefault(gram, []).append(i)
+    return {gram: np.array(posting, dtype=np.int32)
+            for gram, posting in postings.items()}
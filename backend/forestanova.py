@@ -0,0 +1,221 @@
+from collections import OrderedDict
+from itertools import combinations
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+from joblib import Parallel, delayed
+from sklearn.tree import DecisionTreeRegressor
+from ConfigSpace import ConfigurationSpace
+from ConfigSpace import CategoricalHyperparameter, OrdinalHyperparameter
+from ConfigSpace.hyperparameters import NumericalHyperparameter
+
+
+class NumpyANOVA:
+    """fANOVA on a forest of scikit-learn regression trees, as an
+    alternative engine to the pyrfr forest of the fanova package, with the
+    part of the fANOVA interface that run_fanova uses. Every tree is
+    turned into the boxes of its leaves, from which the variance of a
+    marginal is computed for all cells of the grid of split values at
+    once.
+
+    Every tree is fit on a bootstrap sample of the runs. Rows can stand
+    for several runs with sample_weight, like the setups of deduplicated
+    data, and are then drawn as often as those runs would be. The trees
+    are fit and converted in n_jobs threads, by default on all cores.
+    Categorical and ordinal hyperparameters are split as ordered codes
+    instead of as sets of values, every value getting the same width.
+    """
+
+    def __init__(self, X: pd.DataFrame, Y: np.ndarray,
+                 config_space: ConfigurationSpace,
+                 n_trees: int = 16,
+                 seed: int | None = None,
+                 max_depth: int = 64,
+                 min_samples_split: int = 0,
+                 min_samples_leaf: int = 0,
+                 n_jobs: int | None = None,
+                 sample_weight: np.ndarray | None = None):
+        self.cs = config_space
+        self.names = list(config_space.keys())
+        self.n_jobs = n_jobs or -1
+
+        # the bootstrap samples as the amount of draws of every row
+        rng = np.random.default_rng(seed)
+        weights = (np.ones(len(Y)) if sample_weight is None
+                   else np.asarray(sample_weight, np.float64))
+        draws = rng.multinomial(round(weights.sum()), weights / weights.sum(),
+                                size=n_trees)
+        trees = [DecisionTreeRegressor(
+                    max_depth=max_depth,
+                    min_samples_split=max(2, min_samples_split),
+                    min_samples_leaf=max(1, min_samples_leaf),
+                    max_features=0.7,
+                    random_state=tree_seed)
+                 for tree_seed in rng.integers(2**31 - 1, size=n_trees)]
+        features = X[self.names].to_numpy(np.float64)
+        self._parallel(_fit_tree, list(zip(trees, draws)), features, Y)
+
+        bounds = np.array([_domain(param)
+                           for param in config_space.values()])
+        self.trees = self._parallel(_tree_leaves, trees, bounds)
+        self.trees_total_variance = np.array([
+            _weighted_variance(values, (upper - lower).prod(axis=1))
+            for lower, upper, values in self.trees])
+
+        self.V_U_total: dict[tuple[int, ...], np.ndarray] = {}
+        self.V_U_individual: dict[tuple[int, ...], np.ndarray] = {}
+
+    def _parallel(self, function: Callable, items: list, *args: Any
+                  ) -> list:
+        return Parallel(n_jobs=self.n_jobs, prefer='threads')(
+            delayed(function)(item, *args) for item in items)
+
+    def _compute_marginals(self, dimensions: tuple[int, ...]) -> None:
+        for k in range(1, len(dimensions) + 1):
+            for dims in combinations(dimensions, k):
+                if dims in self.V_U_total:
+                    continue
+
+                total = np.array(self._parallel(_marginal_variance,
+                                                self.trees, dims))
+                individual = total.copy()
+                for j in range(1, k):
+                    for sub_dims in combinations(dims, j):
+                        individual -= self.V_U_individual[sub_dims]
+
+                self.V_U_total[dims] = total
+                self.V_U_individual[dims] = np.clip(individual, 0, np.inf)
+
+    def quantify_importance(self, dims: tuple[int, ...]
+                            ) -> dict[tuple[int, ...], dict[str, float]]:
+        """The importance of dims and all their subsets, like
+        fANOVA.quantify_importance with hyperparameter indices.
+        """
+        dimensions = tuple(dims)
+        self._compute_marginals(dimensions)
+
+        nonzero = self.trees_total_variance > 0
+        if not nonzero.any():
+            raise RuntimeError('Encountered zero total variance in all '
+                               'trees.')
+        variance = self.trees_total_variance[nonzero]
+
+        importance = {}
+        for k in range(1, len(dimensions) + 1):
+            for sub_dims in combinations(dimensions, k):
+                individual = self.V_U_individual[sub_dims][nonzero] / variance
+                total = self.V_U_total[sub_dims][nonzero] / variance
+                importance[sub_dims] = {
+                    'individual importance': float(np.mean(individual)),
+                    'total importance': float(np.mean(total)),
+                    'individual std': float(np.std(individual)),
+                    'total std': float(np.std(total))}
+        return importance
+
+    def get_most_important_pairwise_marginals(
+            self, params: list[int] | None = None, n: int = 10
+            ) -> OrderedDict[tuple[str, str], float]:
+        """The importance of the n most important pairs of hyperparameter
+        indices params (all of them by default), by name and sorted like
+        fANOVA.get_most_important_pairwise_marginals. All pairs are
+        returned if params is specified.
+        """
+        dimensions = range(len(self.names)) if params is None else params
+        scores = {}
+        for a, b in combinations(dimensions, 2):
+            score = self.quantify_importance((a, b))[(a, b)]
+            scores[(self.names[a], self.names[b])] = \
+                score['individual importance']
+
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+        if params is None:
+            ranked = ranked[:n]
+        return OrderedDict((pair, scores[pair]) for pair in ranked)
+
+
+def _domain(param: Any) -> tuple[float, float]:
+    if isinstance(param, NumericalHyperparameter):
+        return param.lower, param.upper
+    if isinstance(param, CategoricalHyperparameter):
+        return -0.5, len(param.choices) - 0.5
+    if isinstance(param, OrdinalHyperparameter):
+        return -0.5, len(param.sequence) - 0.5
+    return -0.5, 0.5
+
+
+def _fit_tree(tree_draws: tuple[Any, np.ndarray], X: np.ndarray,
+              Y: np.ndarray) -> None:
+    tree, draws = tree_draws
+    tree.fit(X, Y, sample_weight=draws)
+
+
+def _tree_leaves(estimator: Any, bounds: np.ndarray
+                 ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """The lower and upper bounds of the boxes of the leaves of a fitted
+    tree, scaled to the unit cube by the bounds of the hyperparameters,
+    and the predictions of the leaves.
+    """
+    tree = estimator.tree_
+    left, right = tree.children_left, tree.children_right
+    feature = np.maximum(tree.feature, 0)
+    threshold = np.clip((tree.threshold - bounds[feature, 0])
+                        / (bounds[feature, 1] - bounds[feature, 0]), 0, 1)
+
+    lower = np.zeros((tree.node_count, len(bounds)))
+    upper = np.ones((tree.node_count, len(bounds)))
+
+    # the boxes of the children follow from their parents, level by level
+    nodes = np.array([0])
+    while len(nodes) > 0:
+        nodes = nodes[left[nodes] >= 0]
+        split, value = feature[nodes], threshold[nodes]
+        for children in (left[nodes], right[nodes]):
+            lower[children] = lower[nodes]
+            upper[children] = upper[nodes]
+        upper[left[nodes], split] = value
+        lower[right[nodes], split] = value
+        nodes = np.concatenate([left[nodes], right[nodes]])
+
+    leaves = left < 0
+    return lower[leaves], upper[leaves], tree.value[leaves, 0, 0]
+
+
+def _marginal_variance(leaves: tuple[np.ndarray, np.ndarray, np.ndarray],
+                       dims: tuple[int, ...]) -> float:
+    """The variance of the marginal prediction of a tree for the
+    hyperparameters dims, over the grid of its split values of dims.
+    """
+    lower, upper, values = leaves
+    dims_list = list(dims)
+
+    # the prediction of a leaf averaged over the other hyperparameters
+    rest = np.delete(upper - lower, dims_list, axis=1).prod(axis=1) * values
+
+    edges = [np.unique(np.concatenate([lower[:, d], upper[:, d]]))
+             for d in dims_list]
+    starts = [np.searchsorted(e, lower[:, d]) for e, d in zip(edges, dims)]
+    stops = [np.searchsorted(e, upper[:, d]) for e, d in zip(edges, dims)]
+
+    # every leaf adds to a block of cells, summed from the differences at
+    # its corners along every axis
+    marginal = np.zeros([len(e) for e in edges])
+    for corner in range(2 ** len(dims)):
+        index = tuple(stops[i] if corner >> i & 1 else starts[i]
+                      for i in range(len(dims)))
+        sign = -1 if bin(corner).count('1') % 2 else 1
+        np.add.at(marginal, index, sign * rest)
+    for axis in range(len(dims)):
+        marginal = np.cumsum(marginal, axis=axis)
+    marginal = marginal[tuple(slice(-1) for _ in dims)]
+
+    weights = np.ones(())
+    for e in edges:
+        weights = np.multiply.outer(weights, np.diff(e))
+    return _weighted_variance(marginal.ravel(), weights.ravel())
+
+
+def _weighted_variance(values: np.ndarray, weights: np.ndarray) -> float:
+    mean = np.sum(weights * values) / np.sum(weights)
+    return float(np.sum(weights * (values - mean) ** 2) / np.sum(weights))
@@ -2,11 +2,38 @@
 from os import makedirs
 from os.path import exists
 
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
+from operator import itemgetter
+from threading import Lock, get_ident
+from time import sleep, time
+from typing import Callable, Iterator, TypeVar
+
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 from openml import flows, study, evaluations, setups, exceptions
 
 
+# The on-disk cache of fetched runs. Cached runs are refreshed after
+# RUN_CACHE_TTL seconds, and the least recently used files are removed
+# once the cache grows beyond RUN_CACHE_SIZE bytes.
+RUN_CACHE_DIR = './run_cache'
+RUN_CACHE_TTL = 24 * 60 * 60
+RUN_CACHE_SIZE = 2 * 1024 ** 3
+
+# The maximum length of a comma separated list of IDs in one request,
+# and the amount of attempts for every batch of setups.
+ID_LIST_LENGTH = 2000
+SETUP_ATTEMPTS = 3
+
+T = TypeVar('T')
+
+
 def fetch_flows() -> pd.DataFrame | None:
     """Fetch all flows on openml, in a dataframe indexed on flow ID, and
     with columns for the name and version (which even together are not
@@ -46,58 +73,500 @@ def fetch_tasks(suite_id: int) -> list[int] | None:
 
 def fetch_runs(flow_id: int,
                task_id: int,
-               max_runs: int | None = None) -> pd.DataFrame | None:
+               max_runs: int | None = None,
+               metric: str = 'predictive_accuracy',
+               cache_dir: str | None = None) -> pd.DataFrame | None:
     """Fetch the hyperparameter setups and resulting evaluations
     for the algorithm with flow_id in th task with task_id, in a
     dataframe with index run_id and value and parameters in all
     separate columns. If specified, retrieve at most max_runs
-    setup-evaluation combinations.
-    """
-    # First we check if there are even enough runs with this fast
-    # function. This does not throw errors for invalid ids.
-    evals = evaluations.list_evaluations(function='predictive_accuracy',
-                                         tasks=[task_id],
-                                         flows=[flow_id],
-                                         output_format='dataframe',
-                                         size=max_runs)
+    setup-evaluation combinations. If cache_dir is specified, runs
+    fetched less than RUN_CACHE_TTL seconds ago are read from the cache
+    in that directory, and newly fetched runs are stored in it. Older
+    cached runs are refreshed incrementally, as OpenML only adds runs.
+    When OpenML cannot be reached, cached runs are used regardless of age.
+    """
+    runs = fetch_suite_runs(flow_id, [task_id], max_runs, metric,
+                            cache_dir=cache_dir)
+    return runs.get(task_id)
+
+
+def fetch_suite_runs(flow_id: int,
+                     task_ids: list[int],
+                     max_runs: int | None = None,
+                     metric: str = 'predictive_accuracy',
+                     max_workers: int = 8,
+                     progress: Callable[[int, int], None] | None = None,
+                     cache_dir: str | None = None) -> dict[int, pd.DataFrame]:
+    """Fetch the runs of the algorithm with flow_id on all tasks in
+    task_ids, as fetch_runs does for one task, leaving out tasks without
+    runs. The evaluations of all tasks are listed in a few paginated
+    requests, after which the setups of all tasks are collected at once,
+    so setups shared by several tasks are only collected once. At most
+    max_workers requests are made at the same time. If specified,
+    progress is called with the amount of finished and total steps, two
+    for every task: listing its evaluations and collecting its setups.
+    The total stays the same, while the finished steps only increase.
+    Collected setups are also cached in cache_dir, if specified.
+    """
+    runs: dict[int, pd.DataFrame] = {}
+    # The stale cached runs, and whether they contain all runs
+    cached: dict[int, tuple[pd.DataFrame, bool]] = {}
+    # The max_runs to list the evaluations of the other tasks with
+    limits: dict[int, int | None] = {}
+
+    for task in task_ids:
+        entry = None
+        if cache_dir is not None:
+            entry = _read_run_cache(_run_cache_path(cache_dir, flow_id,
+                                                    task, metric))
+        if entry is None:
+            limits[task] = max_runs
+            continue
+
+        data, meta = entry
+        fresh = time() - meta['fetched'] <= RUN_CACHE_TTL
+        complete = meta['max_runs'] is None or len(data) < meta['max_runs']
+        if fresh and (complete or (max_runs is not None
+                                   and max_runs <= len(data))):
+            runs[task] = data
+        else:
+            cached[task] = (data, complete)
+            # If we have all runs up to some point, we add the newer ones,
+            # up to the larger of the cached and the requested limit
+            limits[task] = max_runs
+            if complete and max_runs is not None:
+                limits[task] = (None if meta['max_runs'] is None
+                                else max(meta['max_runs'], max_runs))
+
+    try:
+        evals = _list_suite_evaluations(
+            flow_id, limits, metric, max_workers,
+            _phase_progress(progress, 0, len(task_ids)))
+
+        # Only add runs newer than the complete cached ones, and
+        # reuse the setups those already contain
+        known = [pd.DataFrame(index=pd.Index([], name='setup_id'))]
+        for task, (data, complete) in cached.items():
+            if complete:
+                watermark = data.index.max() if len(data) > 0 else -1
+                evals[task] = evals[task][evals[task].index > watermark]
+                known.append(data.drop(columns=['value'])
+                                 .drop_duplicates(subset='setup_id')
+                                 .set_index('setup_id'))
+        params = pd.concat(known)
+        params = params[~params.index.duplicated()]
+
+        ids = {setup for task_evals in evals.values()
+               for setup in task_evals.setup_id}
+        ids -= set(params.index)
+        params = pd.concat([params,
+                            _collect_parameters(
+                                flow_id, sorted(ids),
+                                _phase_progress(progress, 1, len(task_ids)),
+                                max_workers, cache_dir)])
+    except (OSError, exceptions.OpenMLServerException):
+        # Work offline, if we have these runs at all
+        if len(cached) < len(limits):
+            raise
+        runs.update({task: data for task, (data, _) in cached.items()})
+        evals = {}
+
+    for task, task_evals in evals.items():
+        # Match the evaluations with the normalised setups, keeping
+        # only the parameters that occur in this task
+        data = task_evals.join(params, on='setup_id')
+        present = data.notna().any()
+        present[['setup_id', 'value']] = True
+        data = data.loc[:, present]
+        if task in cached and cached[task][1]:
+            old_data = cached[task][0]
+            if data.empty:
+                data = old_data
+            elif not old_data.empty:
+                data = pd.concat([old_data, data])
+
+        if cache_dir is not None:
+            _write_run_cache(_run_cache_path(cache_dir, flow_id,
+                                             task, metric),
+                             data, limits[task])
+        runs[task] = data
+
+    if cache_dir is not None:
+        _evict_run_cache(cache_dir, RUN_CACHE_SIZE)
+    if progress is not None:
+        progress(2 * len(task_ids), 2 * len(task_ids))
+
+    result = {}
+    for task in task_ids:
+        data = runs[task]
+        if not data.empty:
+            data = data.drop(columns=['setup_id'])
+            result[task] = data if max_runs is None else data.head(max_runs)
+
+    return result
+
+
+def iter_suite_runs(flow_id: int,
+                    task_ids: list[int],
+                    max_runs: int | None = None,
+                    metric: str = 'predictive_accuracy',
+                    max_workers: int = 8,
+                    cache_dir: str | None = None
+                    ) -> Iterator[tuple[int, pd.DataFrame | None]]:
+    """Fetch the runs of the algorithm with flow_id on all tasks in
+    task_ids with fetch_runs, with at most max_workers tasks in flight,
+    and yield every task with its runs as soon as they are fetched. This
+    allows processing some tasks while others are still being fetched,
+    but setups are only shared between tasks through the setup cache in
+    cache_dir, if specified. If the caller stops iterating, tasks that
+    have not started yet are dropped.
+    """
+    yield from _completed((lambda task: fetch_runs(flow_id, task, max_runs,
+                                                   metric, cache_dir)),
+                          task_ids, max_workers)
+
+
+def _phase_progress(progress: Callable[[int, int], None] | None,
+                    phase: int,
+                    n_tasks: int) -> Callable[[int, int], None] | None:
+    """Scale the progress of a phase of fetch_suite_runs, which counts
+    its own requests, to the n_tasks steps of that phase out of the
+    2 * n_tasks steps of both phases, so the total does not change
+    between phases.
+    """
+    if progress is None:
+        return None
+
+    def scaled(done: int, total: int) -> None:
+        progress(phase * n_tasks + done * n_tasks // total, 2 * n_tasks)
+
+    return scaled
+
+
+def _map_concurrently(func: Callable[[int], pd.DataFrame],
+                      items: list[int],
+                      max_workers: int,
+                      progress: Callable[[int, int], None] | None = None
+                      ) -> dict[int, pd.DataFrame]:
+    """Apply func to all items with _completed, calling progress with
+    the amount of finished and total items in completion order.
+    """
+    result = {}
+
+    for done, (item, item_result) in enumerate(_completed(func, items,
+                                                          max_workers),
+                                               start=1):
+        result[item] = item_result
+        if progress is not None:
+            progress(done, len(items))
+
+    return result
+
+
+def _completed(func: Callable[[int], T],
+               items: list[int],
+               max_workers: int) -> Iterator[tuple[int, T]]:
+    """Apply func to all items on a thread pool with at most max_workers
+    calls in flight, and yield every item with its result in completion
+    order. If the caller is interrupted (e.g. the background callback is
+    cancelled), calls that have not started yet are dropped.
+    """
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+
+    try:
+        futures = {executor.submit(func, item): item for item in items}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _list_suite_evaluations(flow_id: int,
+                            limits: dict[int, int | None],
+                            metric: str,
+                            max_workers: int,
+                            progress: Callable[[int, int], None] | None
+                            ) -> dict[int, pd.DataFrame]:
+    """List the evaluations of flow_id on every task in limits, with at
+    most the given amount of runs, as _list_evaluations does. Tasks
+    without a limit are listed together in a few requests. OpenML can
+    only limit the amount of evaluations in a request as a whole, so
+    tasks with a limit are listed one by one instead, which is much
+    cheaper when the limit is small compared to the amount of runs.
+    """
+    unlimited = [task for task, limit in limits.items() if limit is None]
+    requests = [(chunk, None) for chunk in _id_batches(unlimited)] \
+        + [([task], limit) for task, limit in limits.items()
+           if limit is not None]
+
+    results = _map_concurrently((lambda i:
+                                 _list_evaluations(flow_id, requests[i][0],
+                                                   requests[i][1], metric)),
+                                list(range(len(requests))), max_workers,
+                                progress)
+
+    # Split the evaluations of every request by task
+    evals = {}
+    for result in results.values():
+        for task, task_evals in result.groupby('task_id'):
+            evals[task] = task_evals.drop(columns=['task_id'])
+
+    empty = _list_evaluations(flow_id, [], 0, metric)
+    return {task: evals.get(task, empty) for task in limits.keys()}
+
+
+def _list_evaluations(flow_id: int,
+                      task_ids: list[int],
+                      max_runs: int | None,
+                      metric: str) -> pd.DataFrame:
+    """List the evaluations of flow_id on the tasks in task_ids, in a
+    dataframe with index run_id and columns task_id, setup_id and value,
+    sorted on run ID. If specified, list at most max_runs evaluations.
+    """
+    # This function is fast, and does not throw errors for invalid ids.
+    # It pages through the results when there are many of them.
+    evals = pd.DataFrame()
+    if len(task_ids) > 0 and max_runs != 0:
+        evals = evaluations.list_evaluations(function=metric,
+                                             tasks=[*task_ids],
+                                             flows=[flow_id],
+                                             output_format='dataframe',
+                                             size=max_runs)
     if evals.empty:
+        return pd.DataFrame({'task_id': pd.Series(dtype='int64'),
+                             'setup_id': pd.Series(dtype='int64'),
+                             'value': pd.Series(dtype='float64')},
+                            index=pd.Index([], name='run_id'))
+
+    return evals.set_index('run_id')[['task_id', 'setup_id', 'value']]\
+                .sort_index()
+
+
+def _collect_parameters(flow_id: int,
+                        setup_ids: list[int],
+                        progress: Callable[[int, int], None] | None,
+                        max_workers: int,
+                        cache_dir: str | None) -> pd.DataFrame:
+    """Collect the parameters of the setups of flow_id in setup_ids, as
+    _list_parameters does. If cache_dir is specified, the setups are read
+    from and added to the setup cache of this flow in that directory.
+    Setups never change, so they do not expire.
+    """
+    if cache_dir is None:
+        return _list_parameters(setup_ids, progress, max_workers)
+
+    path = os.path.join(cache_dir, f'f{flow_id}_setups.parquet')
+    params = _read_setup_cache(path)
+
+    missing = [setup for setup in setup_ids if setup not in params.index]
+    if len(missing) > 0:
+        new_params = _list_parameters(missing, progress, max_workers)
+
+        # Concurrent fetches of the same flow may have added setups in
+        # the meantime, which we should not overwrite
+        with _setup_cache_lock:
+            params = _read_setup_cache(path)
+            new_params = new_params[~new_params.index.isin(params.index)]
+            params = pd.concat([params, new_params])
+            params.index.name = 'setup_id'
+            _write_parquet(pa.Table.from_pandas(params), path)
+
+    return params[params.index.isin(setup_ids)]
+
+
+def _read_setup_cache(path: str) -> pd.DataFrame:
+    """Read the cached setups in path, which may not exist yet."""
+    try:
+        return pd.read_parquet(path)
+    except (OSError, pa.ArrowException):
+        return pd.DataFrame(index=pd.Index([], name='setup_id'))
+
+
+_setup_cache_lock = Lock()
+
+
+def _list_parameters(setup_ids: list[int],
+                     progress: Callable[[int, int], None] | None = None,
+                     max_workers: int = 8) -> pd.DataFrame:
+    """Collect the parameters of the setups in setup_ids, in a dataframe
+    indexed on setup ID with a column for every parameter. This is done
+    in batches, of which at most max_workers are collected at the same
+    time. If specified, progress is called with the amount of finished
+    and total batches.
+    """
+    batches = _id_batches(setup_ids)
+    if len(batches) == 0:
+        return pd.DataFrame(index=pd.Index([], name='setup_id'))
+
+    results = _map_concurrently((lambda i:
+                                 _list_setup_batch(batches[i],
+                                                   SETUP_ATTEMPTS)),
+                                list(range(len(batches))), max_workers,
+                                progress)
+
+    params = pd.concat([results[i] for i in range(len(batches))])
+    return normalise_parameters(params)
+
+
+def normalise_parameters(params: pd.Series) -> pd.DataFrame:
+    """Split the parameters column of list_setups into a dataframe with
+    the same index and a column for every parameter, in order of first
+    appearance. Parameters missing from a setup are NaN.
+    """
+    # Flatten into (row, parameter, value) triples, which are then
+    # written into the table at once
+    p_lists = [() if p_list is None else p_list.values()
+               for p_list in params.values]
+    flat = list(chain.from_iterable(p_lists))
+    rows = np.repeat(np.arange(len(p_lists)), [len(p) for p in p_lists])
+    names = list(map(itemgetter('parameter_name'), flat))
+    values = list(map(itemgetter('value'), flat))
+
+    cols, columns = pd.factorize(pd.Series(names, dtype=object))
+    table = np.full((len(params), len(columns)), np.nan, dtype=object)
+    table[rows, cols] = values
+
+    return pd.DataFrame(table, index=params.index, columns=columns)
+
+
+def _id_batches(ids: list[int]) -> list[list[int]]:
+    """Split ids into batches that each fit in one request, as URLs
+    otherwise become too long.
+    """
+    batches: list[list[int]] = []
+    length = ID_LIST_LENGTH
+    for id in ids:
+        length += len(str(id)) + 1
+        if length > ID_LIST_LENGTH:
+            batches.append([])
+            length = len(str(id)) + 1
+        batches[-1].append(id)
+
+    return batches
+
+
+def _list_setup_batch(setup_ids: list[int], attempts: int) -> pd.Series:
+    """Collect the parameters of one batch of setups with the slow
+    list_setups, retrying failed requests at most attempts - 1 times.
+    A batch that fails is retried in two halves, as those are less
+    likely to hit URL length limits or time out.
+    """
+    try:
+        return setups.list_setups(setup=setup_ids,
+                                  output_format='dataframe')['parameters']
+    except (OSError, exceptions.OpenMLServerException):
+        if attempts <= 1:
+            raise
+
+    if len(setup_ids) == 1:
+        sleep(1)
+        return _list_setup_batch(setup_ids, attempts - 1)
+
+    half = len(setup_ids) // 2
+    return pd.concat([_list_setup_batch(setup_ids[:half], attempts - 1),
+                      _list_setup_batch(setup_ids[half:], attempts - 1)])
+
+
+def _run_cache_path(cache_dir: str,
+                    flow_id: int,
+                    task_id: int,
+                    metric: str) -> str:
+    """The file in cache_dir holding the runs of one flow and task."""
+    return os.path.join(cache_dir,
+                        f'f{flow_id}_t{task_id}_{metric}.parquet')
+
+
+def _read_run_cache(path: str) -> tuple[pd.DataFrame, dict] | None:
+    """Read the cached runs in path, together with the moment they were
+    fetched and the max_runs they were fetched with, or None if there
+    are no cached runs. A cached frame without any rows means that OpenML
+    had no runs at all.
+    """
+    try:
+        table = pq.read_table(path)
+        # Mark the file as recently used, without changing its age
+        os.utime(path, (time(), os.path.getmtime(path)))
+    except (OSError, pa.ArrowException):
         return None
 
-    # Then we collect the associated setups with this slow function
-    # In batches, because URLs otherwise become too long
-    ids = evals.setup_id.drop_duplicates().values
-    tot = len(ids)
-    batches = []
-    offset = 0
-    batch_size = 250
-    while offset < tot:
-        batch = setups.list_setups(setup=ids[offset:(offset+batch_size)],
-                                   output_format='dataframe')['parameters']
-        batches.append(batch)
-        offset += batch_size
+    meta = json.loads(table.schema.metadata[b'hpiad'])
+    return table.to_pandas(), meta
 
-    # Split the parameters into separate columns
-    params = pd.concat(batches)
-    params = params.map((lambda p_list: {p['parameter_name']: p['value']
-                                         for p in p_list.values()}))
-    params = pd.json_normalize(params).set_index(params.index)
 
-    # Finally we match the evaluations with the normalised setups
-    evals = evals.set_index('run_id')[['setup_id', 'value']]
-    data = evals.join(params, on='setup_id').drop(columns=['setup_id'])
+def _write_run_cache(path: str,
+                     data: pd.DataFrame,
+                     max_runs: int | None) -> None:
+    """Store the runs fetched with max_runs in path."""
+    table = pa.Table.from_pandas(data)
+    meta = dict(table.schema.metadata or {})
+    meta[b'hpiad'] = json.dumps({'fetched': time(),
+                                 'max_runs': max_runs}).encode()
+    _write_parquet(table.replace_schema_metadata(meta), path)
 
-    return data
+
+def _write_parquet(table: pa.Table, path: str) -> None:
+    """Write table to path, through a temporary file so that readers
+    never see half a file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.{get_ident()}.tmp'
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _evict_run_cache(cache_dir: str, max_size: int) -> None:
+    """Remove the least recently used files from the cache in cache_dir
+    until it takes up at most max_size bytes.
+    """
+    files = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.parquet'):
+            stat = entry.stat()
+            files.append((stat.st_atime, stat.st_size, entry.path))
+
+    total = sum(size for (_, size, _) in files)
+    for (_, size, path) in sorted(files):
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Another fetch already evicted this file
+            pass
+        total -= size
 
 
 def coerce_types(data: pd.DataFrame) -> pd.DataFrame:
     """Coerce the types in data and return the resulting dataframe.
-    All columns will be either numeric or string d_type.
+    Columns with any numeric values become numeric, in the smallest
+    dtype that holds all their values exactly, and all other columns
+    become categorical.
     """
-    p_num = data.map(pd.to_numeric, errors="coerce")
-    p_cat = data.loc[:, p_num.isna().all()].astype('string')
-    p_num[p_cat.columns] = p_cat
+    result = {}
+
+    for col in data.columns:
+        num = pd.to_numeric(data[col], errors='coerce')
+        if num.isna().all():
+            result[col] = data[col].astype('string').astype('category')
+        else:
+            result[col] = _downcast(num)
+
+    return pd.DataFrame(result, index=data.index)
+
+
+def _downcast(col: pd.Series) -> pd.Series:
+    """Convert the numeric col to the smallest integer or float dtype
+    that holds all its values exactly.
+    """
+    if col.dtype.kind in 'iu':
+        return pd.to_numeric(col, downcast='integer')
+
+    small = col.astype(np.float32)
+    if ((small == col) | col.isna()).all():
+        return small
 
-    return p_num
+    return col
 
 
 def export_csv(flow_id: int,
@@ -60,6 +60,31 @@ def violinplot(fanova_results: pd.DataFrame,
     return fig
 
 
+def seed_errorbars(fanova_results: pd.DataFrame,
+                   variances: pd.DataFrame) -> go.Figure:
+    """Create a bar plot of the mean importance in fanova_results, with
+    error bars of one standard deviation between the seeds of a task,
+    averaged over the tasks. variances has the variance of each column
+    of fanova_results, in the column with the same position.
+    """
+    fig = go.Figure()
+
+    means = fanova_results.mean(axis=0)
+    errors = np.sqrt(variances.mean(axis=0).to_numpy())
+    order = np.argsort(means.to_numpy())
+    names = [pretty_name(name) for name in means.index[order]]
+
+    fig.add_trace(go.Bar(x=names,
+                         y=means.to_numpy()[order],
+                         error_y=dict(type='data', array=errors[order]),
+                         marker_color=colormap(names)))
+
+    fig.update_layout(yaxis_title="Variance Contribution",
+                      xaxis_tickangle=-45)
+
+    return fig
+
+
 def crit_diff_diagram(fanova_results: pd.DataFrame) -> str:
     """Create a critical difference diagram of the data in
     fanova_results, and show the plot iff show == True.
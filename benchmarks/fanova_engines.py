@@ -0,0 +1,47 @@
+"""Compare the importances of the NumPy fANOVA engine with those of the
+pyrfr engine, on the synthetic tasks of benchmarks/fanova_presets.py
+binned like the experiment page does for pairs. Reports the time of
+both, and the largest difference between their importances, over all
+importances either engine computed. An importance that only one engine
+computed counts as 0 for the other, and its name is reported. Run from
+the repository root:
+
+    python -m benchmarks.fanova_engines
+"""
+from time import perf_counter
+
+import pandas as pd
+from ConfigSpace import ConfigurationSpace
+
+from backend.fanovaservice import bin_numeric, prepare_data, run_fanova
+from benchmarks.fanova_presets import synthetic_task
+
+
+def timed_importance(data: pd.DataFrame, space: ConfigurationSpace,
+                     engine: str) -> tuple[pd.Series, float]:
+    start = perf_counter()
+    result = run_fanova(data, space, n_pairs=3, n_triplets=1, seed=0,
+                        engine=engine)
+    return pd.Series(result), perf_counter() - start
+
+
+if __name__ == '__main__':
+    print(f'{"runs":>6} {"pyrfr":>8} {"numpy":>8} {"speedup":>8} '
+          f'{"max diff":>9}')
+    for n_runs in [500, 2000]:
+        data, space = synthetic_task(n_runs, n_params=6)
+        binned, space = bin_numeric({0: data}, space, 16)
+        data = prepare_data(binned, space)[0]
+        pyrfr, pyrfr_time = timed_importance(data, space, 'pyrfr')
+        numpy, numpy_time = timed_importance(data, space, 'numpy')
+        names = pyrfr.index.union(numpy.index)
+        diff = (pyrfr.reindex(names, fill_value=0)
+                - numpy.reindex(names, fill_value=0)).abs()
+        print(f'{n_runs:>6} {pyrfr_time:>7.2f}s {numpy_time:>7.2f}s '
+              f'{pyrfr_time / numpy_time:>7.1f}x {diff.max():>9.3f} '
+              f'({diff.idxmax()})')
+        for engine, missing in [('pyrfr', names.difference(pyrfr.index)),
+                                ('numpy', names.difference(numpy.index))]:
+            if len(missing) > 0:
+                print(f'       not computed by {engine}: '
+                      f'{", ".join(missing)}')
@@ -0,0 +1,59 @@
+"""Compare the importances of the quick fANOVA preset with those of the
+full preset, on synthetic tasks with known structure. Every setup has
+several runs, and the tasks are deduplicated with reduce_data like the
+experiment page does. Reports the time of both, and the Spearman rank
+correlation and Pearson correlation of their importances. Run from the
+repository root:
+
+    python -m benchmarks.fanova_presets
+"""
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+from ConfigSpace import ConfigurationSpace
+
+from backend.fanovaservice import (FOREST_PRESETS, reduce_data,
+                                   run_fanova)
+
+
+def synthetic_task(n_runs: int, n_params: int = 8, seed: int = 0,
+                   runs_per_setup: int = 1
+                   ) -> tuple[pd.DataFrame, ConfigurationSpace]:
+    rng = np.random.default_rng(seed)
+    space = ConfigurationSpace({f'x{i}': (0.0, 1.0) for i in range(n_params)})
+    X = rng.random((n_runs // runs_per_setup, n_params)).round(6)
+    X = np.repeat(X, runs_per_setup, axis=0)
+    n_runs = len(X)
+
+    # parameters get exponentially smaller effects, and two interact
+    weights = 0.7 ** np.arange(n_params)
+    value = (np.sin(3 * X) * weights).sum(axis=1) + X[:, 0] * X[:, 1]
+    value += rng.normal(0, 0.01, n_runs)
+
+    data = pd.DataFrame(X, columns=list(space.keys()))
+    data.insert(0, 'value', value)
+    return data, space
+
+
+def timed_importance(data: pd.DataFrame, space: ConfigurationSpace,
+                     preset: str) -> tuple[pd.Series, float]:
+    start = perf_counter()
+    result = run_fanova(data, space, forest=FOREST_PRESETS[preset], seed=0)
+    return pd.Series(result), perf_counter() - start
+
+
+if __name__ == '__main__':
+    print(f'{"runs":>6} {"setups":>6} {"full":>8} {"quick":>8} '
+          f'{"speedup":>8} {"spearman":>9} {"pearson":>8}')
+    for n_runs in [5000, 20000, 50000]:
+        data, space = synthetic_task(n_runs, runs_per_setup=20)
+        data = reduce_data({0: data})[0]
+        full, full_time = timed_importance(data, space, 'full')
+        quick, quick_time = timed_importance(data, space, 'quick')
+        rank_corr = full.corr(quick, method='spearman')
+        corr = full.corr(quick)
+        print(f'{n_runs:>6} {len(data):>6} {full_time:>7.2f}s '
+              f'{quick_time:>7.2f}s '
+              f'{full_time / quick_time:>7.1f}x {rank_corr:>9.3f} '
+              f'{corr:>8.3f}')
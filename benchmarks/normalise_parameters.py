@@ -0,0 +1,45 @@
+"""Compare normalise_parameters with the per-row json_normalize it
+replaced, on synthetic list_setups output. Run from the repository root:
+
+    python -m benchmarks.normalise_parameters
+"""
+from timeit import timeit
+
+import numpy as np
+import pandas as pd
+
+from backend.openmlfetcher import normalise_parameters
+
+
+def json_normalise_parameters(params: pd.Series) -> pd.DataFrame:
+    params = params.map((lambda p_list: {p['parameter_name']: p['value']
+                                         for p in p_list.values()}))
+    return pd.json_normalize(params).set_index(params.index)
+
+
+def synthetic_setups(n_setups: int, n_params: int = 20) -> pd.Series:
+    rng = np.random.default_rng(0)
+    choices = ['1', '0.001', '"rbf"', 'true', 'null']
+    setups = {}
+    for setup in range(n_setups):
+        setups[setup] = {setup * n_params + i:
+                         {'parameter_name': f'param_{i}',
+                          'value': choices[rng.integers(len(choices))]}
+                         for i in range(n_params) if rng.random() < 0.9}
+    return pd.Series(setups, name='parameters')
+
+
+if __name__ == '__main__':
+    print(f'{"setups":>8} {"json_normalize":>15} {"triples":>10} '
+          f'{"speedup":>8}')
+    for n_setups in [1000, 10000, 100000]:
+        params = synthetic_setups(n_setups)
+        assert json_normalise_parameters(params)\
+            .equals(normalise_parameters(params))
+
+        repeat = max(1, 10000 // n_setups)
+        old = timeit(lambda: json_normalise_parameters(params),
+                     number=repeat) / repeat
+        new = timeit(lambda: normalise_parameters(params),
+                     number=repeat) / repeat
+        print(f'{n_setups:>8} {old:>14.3f}s {new:>9.3f}s {old / new:>7.1f}x')
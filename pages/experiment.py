@@ -4,7 +4,6 @@ import dash_bootstrap_components as dbc
 from ConfigSpace import ConfigurationSpace, Constant
 from dash_extensions.enrich import (Input, Output, State, callback,
                                     dcc, html, Serverside)
-from re import split
 import pandas as pd
 import sys
 import os
@@ -12,6 +11,7 @@ import io
 import zipfile
 import backend.openmlfetcher as fetcher
 import backend.fanovaservice as fnvs
+from backend.flowsearch import search_flows
 
 # Add the utils directory to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -20,12 +20,17 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
 dash.register_page(__name__, path="/experiment")
 
+# the maximum number of tasks listed on OpenML at the same time
+FETCH_WORKERS = 8
+# the amount of processes running fanova, None uses one for every core
+FANOVA_WORKERS = None
+
 
 # convert the fetched data into the right format for the dropdown menu
 # returns a list of dictionaries
 def df_to_dict_list(df, col):
-    return [dict(label=str(id) + "." + row[col], value=id)
-            for id, row in df.iterrows()]
+    return [dict(label=str(id) + "." + str(name), value=id)
+            for id, name in zip(df.index, df[col])]
 
 
 # this contains all the content of the subpage to select the flow and suite
@@ -87,6 +92,15 @@ flow_content = html.Div([
                                                disabled=True,
                                                style={"marginRight": "20px"}
                                                ),
+                                    dbc.Button("Fetch and run fANOVA",
+                                               id="fetch_fanova",
+                                               outline=True,
+                                               size="lg",
+                                               color="primary",
+                                               className="mb-1",
+                                               disabled=True,
+                                               style={"marginRight": "20px"}
+                                               ),
                                     dbc.Button("Export csv",
                                                id="csv",
                                                outline=True,
@@ -161,33 +175,15 @@ def update_suites(suites):
     prevent_initial_call=False
 )
 def update_multi_options(search_value, flows, val):
-    def mask(df: pd.DataFrame, token: str):
-        if token.isnumeric():
-            col = "id_str"
-        else:
-            col = "full_name"
-
-        return df[col].str.contains(token, case=False, regex=False)
-
     if not search_value or flows is None:
         if val is None or flows is None or val not in flows.index:
             raise PreventUpdate
         else:
             return df_to_dict_list(flows.loc[[val]], "full_name")
 
-    results = flows
-    valid_token = False
-    for token in split("[ .]", search_value):
-        if len(token) >= 3:
-            results = results[mask(results, token)]
-            valid_token = True
-
-    if not valid_token:
-        return []
-
-    lst = df_to_dict_list(results, "full_name")
-
-    return lst[:100]
+    # the search index is built once for every flow catalog
+    return [dict(label=str(id) + "." + name, value=id)
+            for id, name in search_flows(flows, search_value)]
 
 
 # propagate local fetched ids to global (app.py) store.
@@ -206,6 +202,7 @@ def propagate_ids(data):
 @callback(
     Output("raw_configspace", "data"),
     Output("raw_data_store", "data"),
+    Output("raw_stats", "data"),
     Output("fetched_ids_local", "data"),
     Output("experiment_warning", "is_open", allow_duplicate=True),
     Output("experiment_warning", "children", allow_duplicate=True),
@@ -217,6 +214,8 @@ def propagate_ids(data):
     background=True,
     running=[
         (Output("Fetch", "disabled"), True, False),
+        (Output("fetch_fanova", "disabled"), True, False),
+        (Output("fanova", "disabled"), True, False),
         (Output("csv", "disabled"), True, False),
         (Output("progress_open_ML", "style"),
             {"visibility": "visible"},
@@ -240,28 +239,119 @@ def fetch_openml_data(set_progress, n_clicks, flow_id, suite_id, max_runs):
     if tasks is None:
         raise PreventUpdate
 
-    data = {}
+    # Fetch the data of all tasks at once, updating the progress bar
+    # as tasks are listed and setups are collected
+    data = fetcher.fetch_suite_runs(
+        flow_id, tasks, max_runs=max_runs, max_workers=FETCH_WORKERS,
+        progress=(lambda done, total: set_progress((str(done), str(total)))),
+        cache_dir=fetcher.RUN_CACHE_DIR)
+    data = {task: fetcher.coerce_types(task_data)
+            for task, task_data in data.items()}
 
-    i = 0
-    for task in tasks:
-        i += 1
-        # Update the progress bar
-        set_progress((str(i), str(len(tasks))))
-        # Fetch the data
-        task_data = fetcher.fetch_runs(flow_id, task, max_runs=max_runs)
+    # Send a warning if no runs exist for this combination
+    if len(data) == 0:
+        return (dash.no_update, dash.no_update, dash.no_update,
+                dash.no_update, True,
+                "This flow/suite combination has no runs.")
+
+    # the statistics of the columns are computed once, and read by the
+    # tables and the fanova tab instead of scanning the data again
+    stats = fnvs.data_stats(data)
+
+    return (fnvs.auto_configspace(data, stats).to_serialized_dict(),
+            Serverside(data),
+            Serverside(stats),
+            {"flow_id": flow_id, "suite_id": suite_id},
+            False,
+            ""
+            )
+
+
+# fetch the runs for a given flow/suite combination, and run fanova on
+# every task as soon as it is fetched, publishing the partial results
+@callback(
+    Output("raw_configspace", "data", allow_duplicate=True),
+    Output("raw_data_store", "data", allow_duplicate=True),
+    Output("raw_stats", "data", allow_duplicate=True),
+    Output("fetched_ids_local", "data", allow_duplicate=True),
+    Output("fanova_results_local", "data", allow_duplicate=True),
+    Output("filtered_config", "data", allow_duplicate=True),
+    Output("experiment_warning", "is_open", allow_duplicate=True),
+    Output("experiment_warning", "children", allow_duplicate=True),
+    Input("fetch_fanova", "n_clicks"),
+    State("flow_input", "value"),
+    State("suite_dropdown", "value"),
+    State("max_runs_per_task", "value"),
+    State("min_runs", "value"),
+    prevent_initial_call=True,
+    background=True,
+    running=[
+        (Output("Fetch", "disabled"), True, False),
+        (Output("fetch_fanova", "disabled"), True, False),
+        (Output("fanova", "disabled"), True, False),
+        (Output("csv", "disabled"), True, False),
+        (Output("progress_open_ML", "style"),
+            {"visibility": "visible"},
+            {"visibility": "hidden"}),
+        (Output("cancel_button", "style"),
+            {"visibility": "visible"},
+            {"visibility": "hidden"})
+    ],
+    progress=[Output("progress_open_ML", "value"),
+              Output("progress_open_ML", "max")],
+    cancel=[Input("cancel_button", "n_clicks")],
+    progress_default=["0", "100"],
+    cache_args_to_ignore=[0]  # Ignore the button clicks
+)
+def fetch_and_run_fanova(set_progress, n_clicks, flow_id, suite_id,
+                         max_runs, min_runs):
+    if flow_id is None or suite_id is None:
+        raise PreventUpdate
+
+    tasks = fetcher.fetch_tasks(suite_id)
 
+    if tasks is None:
+        raise PreventUpdate
+
+    # fetch the tasks in the background, while we run fanova on the
+    # tasks that have already been fetched, on all their runs, as a
+    # filter of the previously fetched data does not apply to them
+    data = {}
+    results = {}
+    runs = fetcher.iter_suite_runs(flow_id, tasks, max_runs=max_runs,
+                                   max_workers=FETCH_WORKERS,
+                                   cache_dir=fetcher.RUN_CACHE_DIR)
+    for i, (task, task_data) in enumerate(runs, start=1):
+        set_progress((str(i), str(len(tasks))))
         if task_data is None:
             continue
+
         data[task] = fetcher.coerce_types(task_data)
+        result = fnvs.analyse_task(data[task], min_runs=min_runs or 0)
+        if result is not None:
+            results[task] = result
+            dash.set_props("fanova_results_local", {"data": (
+                pd.DataFrame.from_dict(results, orient="index").to_json())})
 
     # Send a warning if no runs exist for this combination
     if len(data) == 0:
         return (dash.no_update, dash.no_update, dash.no_update,
-                True, "This flow/suite combination has no runs.")
+                dash.no_update, dash.no_update, dash.no_update, True,
+                "This flow/suite combination has no runs.")
+
+    # keep the order of the suite, not the order of completion
+    data = {task: data[task] for task in tasks if task in data}
+    results = {task: results[task] for task in tasks if task in results}
+    stats = fnvs.data_stats(data)
+    raw_configspace = fnvs.auto_configspace(data, stats).to_serialized_dict()
 
-    return (fnvs.auto_configspace(data).to_serialized_dict(),
+    # the filter starts again from the configspace of the fetched data
+    return (raw_configspace,
             Serverside(data),
+            Serverside(stats),
             {"flow_id": flow_id, "suite_id": suite_id},
+            pd.DataFrame.from_dict(results, orient="index").to_json(),
+            transform_cfg_space(raw_configspace),
             False,
             ""
             )
@@ -304,15 +394,17 @@ def download_raw_data(n_clicks, raw_data, fetched_ids):
                           filename=f"openml_f{flow_id}_s{suite_id}.zip")
 
 
-# enable fetch button if flow and suite are specified
+# enable fetch buttons if flow and suite are specified
 @callback(
     Output("Fetch", "disabled"),
+    Output("fetch_fanova", "disabled"),
     Input("flow_input", "value"),
     Input("suite_dropdown", "value"),
     prevent_initial_call=False
 )
 def toggle_fetch_button(val1, val2):
-    return val1 is None or val2 is None
+    disabled = val1 is None or val2 is None
+    return disabled, disabled
 
 
 # disable/enable download and analysis buttons based on data availability
@@ -334,6 +426,8 @@ def toggle_buttons(data):
     Input("fanova", "n_clicks"),
     State("raw_data_store", "data"),
     State("filtered_data", "data"),
+    State("raw_stats", "data"),
+    State("filtered_stats", "data"),
     State("final_cfg_space", "data"),
     State("min_runs", "value"),
     State("log_scale_choice", "data"),
@@ -341,9 +435,22 @@ def toggle_buttons(data):
     State("pairwise_toggle", "value"),
     State("n_pairs_input", "value"),
     State("n_bins_input", "value"),
+    State("exhaustive_pairs", "value"),
+    State("n_triplets_input", "value"),
+    State("triplet_seconds_input", "value"),
+    State("n_seeds_input", "value"),
+    State("engine_select", "value"),
+    State("forest_preset", "value"),
+    State("n_trees_input", "value"),
+    State("max_depth_input", "value"),
+    State("min_leaf_input", "value"),
+    State("max_rows_input", "value"),
+    State("seed_input", "value"),
     prevent_initial_call=True,
     background=True,
     running=[
+        (Output("Fetch", "disabled"), True, False),
+        (Output("fetch_fanova", "disabled"), True, False),
         (Output("fanova", "disabled"), True, False),
         (Output("progress_fanova", "style"),
             {"visibility": "visible"},
@@ -358,9 +465,11 @@ def toggle_buttons(data):
     progress_default=["0", "100"],
     cache_args_to_ignore=[0]  # Ignore the button clicks
 )
-def run_fanova(set_progress, n_clicks, raw_data, filtered_data,
-               cfg_space, min_runs, log_data, param_selection,
-               toggle_pairs, n_pairs, n_bins):
+def run_fanova(set_progress, n_clicks, raw_data, filtered_data, raw_stats,
+               filtered_stats, cfg_space, min_runs, log_data, param_selection,
+               toggle_pairs, n_pairs, n_bins, exhaustive_pairs, n_triplets,
+               triplet_seconds, n_seeds, engine, preset, n_trees, max_depth,
+               min_leaf, max_rows, seed):
     if raw_data is None and filtered_data is None:
         # display warning that there is no data to perform fanova on
         return dash.no_update, True, "No data available to run fANOVA."
@@ -371,12 +480,15 @@ def run_fanova(set_progress, n_clicks, raw_data, filtered_data,
         return (dash.no_update, True,
                 "Please select at least two parameters for analysis.")
 
-    data = filtered_data if (filtered_data is not None and
-                             len(filtered_data) != 0) else raw_data
+    if filtered_data is not None and len(filtered_data) != 0:
+        data, stats = filtered_data, filtered_stats
+    else:
+        data, stats = raw_data, raw_stats
     cfg_space = ConfigurationSpace.from_serialized_dict(cfg_space)
 
     # impute the data and make it numeric for fanova
-    imputed_data, extended_cfg_space = fnvs.impute_data(data, cfg_space)
+    imputed_data, extended_cfg_space = fnvs.impute_data(data, cfg_space,
+                                                        stats)
     if "pairwise" in toggle_pairs:
         n_pairs = n_pairs or 3
         n_bins = n_bins or 32
@@ -394,41 +506,86 @@ def run_fanova(set_progress, n_clicks, raw_data, filtered_data,
     selected_space = ConfigurationSpace([extended_cfg_space[select]
                                         for select in param_selection])
 
-    # running fanova takes quite long, so I split it per task
-    results = {}
-    i = 0
+    # the forest settings can only be changed from the presets if custom
+    if preset == "custom":
+        forest = fnvs.forest_params(n_trees=n_trees, max_depth=max_depth,
+                                    min_samples_leaf=min_leaf,
+                                    max_rows=max_rows)
+    else:
+        forest = fnvs.forest_params(preset)
+
+    # running fanova takes quite long, so the tasks are run in parallel
+    # and only pairs of the most important hyperparameters are computed,
+    # unless an exhaustive search was chosen
     n = len(selected_space)
     total_pairs = (n*(n-1)) // 2
-    for task, task_data in processed_data.items():
-        # update the progress bar
-        i += 1
-        set_progress((str(i), str(len(processed_data))))
-        if len(task_data) < min_runs:
-            continue
-
-        # run fanova, with or without pairwise marginals
-        selected_data = task_data[["value"] + param_selection]
-        if "pairwise" in toggle_pairs:
-            results[task] = fnvs.run_fanova(selected_data,
-                                            selected_space,
-                                            total_pairs)
-        else:
-            results[task] = fnvs.run_fanova(selected_data,
-                                            selected_space,
-                                            0)
+    exhaustive = "exhaustive" in exhaustive_pairs
+    task_pairs = 0
+    if "pairwise" in toggle_pairs:
+        task_pairs = total_pairs if exhaustive else n_pairs
+    selected_data = {task: task_data[["value"] + param_selection]
+                     for task, task_data in processed_data.items()
+                     if len(task_data) >= min_runs}
+
+    # runs with the same setup of the selected hyperparameters become one
+    # row weighted by its runs, of which the forest samples at most
+    # max_rows per fit
+    selected_data = fnvs.reduce_data(selected_data)
+
+    # update the progress bar
+    def progress(done, total):
+        set_progress((str(done), str(total)))
+
+    fit_args = dict(n_seeds=n_seeds or 1,
+                    n_pairs=task_pairs,
+                    forest=forest,
+                    seed=seed,
+                    prune_pairs=not exhaustive,
+                    engine=engine or "pyrfr")
+    if "pairwise" in toggle_pairs and n_triplets:
+        fit_args.update(n_triplets=n_triplets,
+                        triplet_seconds=triplet_seconds or 0)
+
+    # on a deployment server the tasks are spread over the celery workers
+    if fnvs.celery_enabled():
+        results = fnvs.run_fanova_group(selected_data, selected_space,
+                                        progress=progress, **fit_args)
+    else:
+        results = fnvs.run_fanova_tasks(selected_data, selected_space,
+                                        n_workers=FANOVA_WORKERS,
+                                        progress=progress, **fit_args)
 
     results = pd.DataFrame.from_dict(results, orient="index")
 
-    # choose only the n_pairs most important pairs
-    if "pairwise" in toggle_pairs and n_pairs < total_pairs:
-        pairwise = results.iloc[:, n:]
+    # the variances between seeds are kept apart from the importances
+    is_variance = results.columns.str.endswith(fnvs.VARIANCE_SUFFIX)
+    variances = results.loc[:, is_variance]
+    results = results.loc[:, ~is_variance]
+
+    # pairs and triplets that were not computed for a task, because they
+    # are not among its most important ones, are taken as unimportant
+    results.iloc[:, n:] = results.iloc[:, n:].fillna(0)
+
+    # choose only the n_pairs most important pairs, and the n_triplets
+    # most important triplets
+    for size, keep in [(1, n_pairs), (2, n_triplets or 0)]:
+        order = results.columns[n:].str.count("_-_")
+        interactions = results.iloc[:, n:].loc[:, order == size]
+        if "pairwise" not in toggle_pairs or keep >= interactions.shape[1]:
+            continue
         avg_ranks = (
-            pairwise.rank(axis=1)
+            interactions.rank(axis=1)
             .mean(axis=0)
             .sort_values(ascending=False)
             .index
             )
-        results = results.drop(columns=avg_ranks[n_pairs:])
+        results = results.drop(columns=avg_ranks[keep:])
+
+    # add the variances of the remaining importances
+    variances = variances.fillna(0)
+    kept = [name + fnvs.VARIANCE_SUFFIX for name in results.columns
+            if name + fnvs.VARIANCE_SUFFIX in variances.columns]
+    results = pd.concat([results, variances[kept]], axis=1)
 
     return results.to_json(), False, ""
 
@@ -527,6 +684,13 @@ def table_formatting(min_runs, data):
                 "column_id": "Filtered runs"
             },
             "backgroundColor": "#FF4136"
+        },
+        {
+            "if": {
+                "filter_query": f"{{Matching runs}} < {min_runs}",
+                "column_id": "Matching runs"
+            },
+            "backgroundColor": "#FF4136"
         }
     ]
 
@@ -784,33 +948,71 @@ def update_categorical_hyperparameter(categories, raw_configspace,
     return filtered_config
 
 
+# previews how many runs of every task fit the ranges while they are being
+# edited, only evaluating the hyperparameters whose range changed
+@callback(
+    Output("runs_table", "data", allow_duplicate=True),
+    Output("filter_masks", "data", allow_duplicate=True),
+    Input("filtered_config", "data"),
+    State("raw_data_store", "data"),
+    State("runs_table", "data"),
+    State("filter_masks", "data"),
+    prevent_initial_call=True
+)
+def preview_filter(filter_cfg, raw_data, runs, masks):
+    if raw_data is None or not runs:
+        raise PreventUpdate
+
+    serialized = {"hyperparameters": (filter_cfg or {}).values()}
+    filter_space = ConfigurationSpace.from_serialized_dict(serialized)
+
+    # the masks are shared with the filter, which can then reuse them all
+    masks = fnvs.filter_masks(raw_data, filter_space, masks)
+    counts = fnvs.filter_counts(raw_data, masks)
+
+    runs = [{**row, "Matching runs": counts.get(row["Task"])}
+            for row in runs]
+    return runs, Serverside(masks)
+
+
 # handles the final filtering of the space when the users clicks the button
 @callback(
     Output(component_id="filtered_data", component_property="data"),
+    Output(component_id="filtered_stats", component_property="data"),
+    Output(component_id="filter_masks", component_property="data"),
     Output(component_id="runs_table", component_property="data"),
     Output(component_id="nan_table", component_property="data"),
     Output(component_id="const_table", component_property="data"),
     Input(component_id="filter_button", component_property="n_clicks"),
     Input(component_id="raw_data_store", component_property="data"),
+    State(component_id="raw_stats", component_property="data"),
     State(component_id="raw_configspace", component_property="data"),
     State(component_id="filtered_config", component_property="data"),
+    State(component_id="filter_masks", component_property="data"),
     prevent_initial_call=False
 )
-def filter_action(n_clicks, raw_data, raw_space, filter_cfg):
-    def nan_count(data, col):
-        counts = [df[col].isna().sum() for df in data.values()]
-        return sum(counts)
+def filter_action(n_clicks, raw_data, raw_stats, raw_space, filter_cfg,
+                  masks):
+    # the missing values are read from the statistics of the columns
+    def nan_count(stats, col):
+        return sum(task_stats[col]["nulls"] for task_stats in stats.values()
+                   if col in task_stats)
 
     if raw_data is None or len(raw_data) == 0:
-        return None, None, None, None
+        return None, None, None, None, None, None
+
+    if raw_stats is None:
+        raw_stats = fnvs.data_stats(raw_data)
 
     if (dash.callback_context.triggered_id == "raw_data_store"
             or filter_cfg is None):
         return (None,
+                None,
+                None,
                 [{"Task": id, "Runs": len(raw_data[id])}
                  for id in raw_data.keys()],
                 [{"Hyperparameter": p["name"],
-                    "Missing values": nan_count(raw_data, p["name"])}
+                    "Missing values": nan_count(raw_stats, p["name"])}
                  for p in raw_space["hyperparameters"]
                  if p["type"] != "constant"],
                 [{"Constant Hyperparameters": p["name"]}
@@ -820,19 +1022,27 @@ def filter_action(n_clicks, raw_data, raw_space, filter_cfg):
     serialized = {"hyperparameters": filter_cfg.values()}
     filter_space = ConfigurationSpace.from_serialized_dict(serialized)
 
-    filtered = fnvs.filter_data(raw_data, filter_space)
+    # the masks of the previous filter are kept, so only the hyperparameters
+    # whose range changed since then are evaluated again
+    masks = fnvs.filter_masks(raw_data, filter_space, masks)
+    filtered = fnvs.filter_data(raw_data, filter_space, masks)
+    filtered_stats = fnvs.data_stats(filtered)
 
+    # the table keeps the preview of the ranges, which now match the filter
+    counts = fnvs.filter_counts(raw_data, masks)
     runs = [{"Task": id,
              "Original runs": len(raw_data[id]),
-             "Filtered runs": len(filtered[id])}
+             "Filtered runs": len(filtered[id]),
+             "Matching runs": counts[id]}
             for id in raw_data.keys()]
 
     nans = [{"Hyperparameter": p["name"],
-             "Original missing values": nan_count(raw_data, p["name"]),
-             "Filtered missing values": nan_count(filtered, p["name"])}
+             "Original missing values": nan_count(raw_stats, p["name"]),
+             "Filtered missing values": nan_count(filtered_stats, p["name"])}
             for p in raw_space["hyperparameters"] if p["type"] != "constant"]
 
-    return Serverside(filtered), runs, nans, dash.no_update
+    return (Serverside(filtered), Serverside(filtered_stats),
+            Serverside(masks), runs, nans, dash.no_update)
 
 
 @callback(
@@ -900,12 +1110,185 @@ fanova_content = html.Div([
                         persistence_type="session",
                     )
                 )
-            ])
+            ]),
+            html.Br(),
+            dbc.Row([
+                dbc.Col(
+                    html.Div("Enter the number of most important"
+                             " three-way interactions to show:")
+                ),
+                dbc.Col(
+                    dbc.Input(
+                        id="n_triplets_input",
+                        type="number",
+                        min=0,
+                        value=0,
+                        persistence=True,
+                        persistence_type="session",
+                    )
+                )
+            ]),
+            html.Br(),
+            dbc.Row([
+                dbc.Col(
+                    html.Div("Maximum time in seconds to search"
+                             " three-way interactions per task"
+                             " (0 for no limit):")
+                ),
+                dbc.Col(
+                    dbc.Input(
+                        id="triplet_seconds_input",
+                        type="number",
+                        min=0,
+                        value=30,
+                        persistence=True,
+                        persistence_type="session",
+                    )
+                )
+            ]),
+            html.Br(),
+            dbc.Checklist(
+                id="exhaustive_pairs",
+                options=[{"label": ("Compute all pairs, instead of only"
+                                    " pairs of the most important"
+                                    " hyperparameters (slower)"),
+                          "value": "exhaustive"}],
+                value=[],
+                persistence=True,
+                persistence_type="session"
+            )
         ],
         id="pairwise_settings_collapse",
         is_open=False,
     ),
 
+    html.Br(),
+    dbc.Row([
+        dbc.Col(html.Div("Random forest settings (the quick preset gives a"
+                         " preview of the importances in a fraction of the"
+                         " time):")),
+        dbc.Col(
+            dbc.RadioItems(
+                id="forest_preset",
+                options=[{"label": "Full", "value": "full"},
+                         {"label": "Quick", "value": "quick"},
+                         {"label": "Custom", "value": "custom"}],
+                value="full",
+                inline=True,
+                persistence=True,
+                persistence_type="session"
+            )
+        )
+    ]),
+    html.Br(),
+    dbc.Row([
+        dbc.Col(html.Div("Number of forests fit per task, with different"
+                         " seeds (their variance is shown as error bars):")),
+        dbc.Col(
+            dbc.Input(
+                id="n_seeds_input",
+                type="number",
+                min=1,
+                value=1,
+                persistence=True,
+                persistence_type="session",
+            )
+        )
+    ]),
+    html.Br(),
+    dbc.Row([
+        dbc.Col(html.Div("fANOVA engine (the NumPy engine fits a"
+                         " scikit-learn forest and is much faster for"
+                         " pairs):")),
+        dbc.Col(
+            dbc.RadioItems(
+                id="engine_select",
+                options=[{"label": "pyrfr", "value": "pyrfr"},
+                         {"label": "NumPy", "value": "numpy"}],
+                value="pyrfr",
+                inline=True,
+                persistence=True,
+                persistence_type="session"
+            )
+        )
+    ]),
+    dbc.Collapse(
+        [
+            html.Br(),
+            dbc.Row([
+                dbc.Col(html.Div("Number of trees:")),
+                dbc.Col(
+                    dbc.Input(
+                        id="n_trees_input",
+                        type="number",
+                        min=1,
+                        value=16,
+                        persistence=True,
+                        persistence_type="session",
+                    )
+                )
+            ]),
+            html.Br(),
+            dbc.Row([
+                dbc.Col(html.Div("Maximum depth of the trees:")),
+                dbc.Col(
+                    dbc.Input(
+                        id="max_depth_input",
+                        type="number",
+                        min=1,
+                        value=64,
+                        persistence=True,
+                        persistence_type="session",
+                    )
+                )
+            ]),
+            html.Br(),
+            dbc.Row([
+                dbc.Col(html.Div("Minimum number of runs in a leaf:")),
+                dbc.Col(
+                    dbc.Input(
+                        id="min_leaf_input",
+                        type="number",
+                        min=0,
+                        value=0,
+                        persistence=True,
+                        persistence_type="session",
+                    )
+                )
+            ]),
+            html.Br(),
+            dbc.Row([
+                dbc.Col(html.Div("Maximum number of runs per task"
+                                 " (0 uses all):")),
+                dbc.Col(
+                    dbc.Input(
+                        id="max_rows_input",
+                        type="number",
+                        min=0,
+                        value=0,
+                        persistence=True,
+                        persistence_type="session",
+                    )
+                )
+            ]),
+            html.Br(),
+            dbc.Row([
+                dbc.Col(html.Div("Seed (empty for a random seed):")),
+                dbc.Col(
+                    dbc.Input(
+                        id="seed_input",
+                        type="number",
+                        min=0,
+                        persistence=True,
+                        persistence_type="session",
+                    )
+                )
+            ])
+        ],
+        id="forest_settings_collapse",
+        is_open=False,
+    ),
+
     html.Br(),
     html.Center(
         dbc.Button(
@@ -961,6 +1344,27 @@ def toggle_pairwise_settings(toggle):
         return False, 3, 32
 
 
+# show the forest settings of the chosen preset, which can only be
+# edited for a custom forest
+@callback(
+    Output("forest_settings_collapse", "is_open"),
+    Output("n_trees_input", "value"),
+    Output("max_depth_input", "value"),
+    Output("min_leaf_input", "value"),
+    Output("max_rows_input", "value"),
+    Input("forest_preset", "value"),
+    prevent_initial_call=False
+)
+def toggle_forest_settings(preset):
+    if preset == "custom":
+        return (True, dash.no_update, dash.no_update, dash.no_update,
+                dash.no_update)
+
+    params = fnvs.FOREST_PRESETS[preset]
+    return (False, params["n_trees"], params["max_depth"],
+            params["min_samples_leaf"], params["max_rows"])
+
+
 # populate the analysis selection dropdown with all non-constant
 # hyperparameters in the filtered data
 @callback(
@@ -969,9 +1373,10 @@ def toggle_pairwise_settings(toggle):
     Input("tabs", "active_tab"),
     Input("raw_configspace", "data"),
     State("filtered_data", "data"),
+    State("filtered_stats", "data"),
     prevent_initial_call=True
 )
-def analysis_options(tab, raw_cfg, filtered_data):
+def analysis_options(tab, raw_cfg, filtered_data, filtered_stats):
     trigger = dash.callback_context.triggered_id
 
     if trigger == "tabs" and (tab != "fanova" or raw_cfg is None):
@@ -983,7 +1388,7 @@ def analysis_options(tab, raw_cfg, filtered_data):
             or len(filtered_data) == 0):
         cfg_space = ConfigurationSpace.from_serialized_dict(raw_cfg)
     else:
-        cfg_space = fnvs.auto_configspace(filtered_data)
+        cfg_space = fnvs.auto_configspace(filtered_data, filtered_stats)
 
     # only non-constant hyperparams
     choices = [name for name, param in cfg_space.items()
@@ -995,8 +1400,11 @@ def analysis_options(tab, raw_cfg, filtered_data):
 layout = dbc.Container(
     [
         dcc.Store(id="raw_data_store", storage_type="session", data=None),
+        dcc.Store(id="raw_stats", storage_type="session", data=None),
         dcc.Store(id="fetched_ids_local", storage_type="session", data=None),
         dcc.Store(id="filtered_data", storage_type="session", data=None),
+        dcc.Store(id="filtered_stats", storage_type="session", data=None),
+        dcc.Store(id="filter_masks", storage_type="session", data=None),
         dcc.Store(id="raw_configspace", storage_type="session", data=None),
         dcc.Store(id="fanova_results_local",
                   storage_type="session", data=None),
@@ -1007,7 +1415,9 @@ layout = dbc.Container(
         dcc.Store(id="filtered_config", storage_type="session"),
         html.H1("Experiment Setup"),
         dcc.Markdown("\n1. Choose which flow and suite you want to analyze."
-                     "Click the fetch button to fetch their data.\n"
+                     "Click the fetch button to fetch their data, or click "
+                     "\"Fetch and run fANOVA\" to analyze all hyperparameters "
+                     "of every task as soon as it is fetched.\n"
                      "2. Filter your configuration space by selecting which "
                      "hyperparameter configurations should be included. By "
                      "default, all configurations are included.\n"
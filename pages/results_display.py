@@ -2,6 +2,7 @@ import dash
 import dash_bootstrap_components as dbc
 from dash_extensions.enrich import Input, Output, State, callback, dcc, html
 import backend.visualiser as vis
+from backend.fanovaservice import VARIANCE_SUFFIX
 from pandas import read_json
 from io import StringIO
 
@@ -12,18 +13,32 @@ dash.register_page(__name__, path="/results")
 @callback(
     Output("violin_plot", "figure"),
     Output("critical_distance_img", "src"),
+    Output("seed_errorbars", "figure"),
+    Output("seed_errorbars_row", "style"),
     Input("fanova_results", "data"),
 )
 def display_results(fanova_results):
     if fanova_results is None:
-        return None, None
+        return None, None, None, {"display": "none"}
 
     fanova_df = read_json(StringIO(fanova_results))
 
+    # the variances between seeds are only shown as error bars
+    is_variance = fanova_df.columns.str.endswith(VARIANCE_SUFFIX)
+    variances = fanova_df.loc[:, is_variance]
+    fanova_df = fanova_df.loc[:, ~is_variance]
+
     violin = vis.violinplot(fanova_df, False)
     crit_diff = (vis.crit_diff_diagram(fanova_df)
                  if len(fanova_df.columns) > 2 else None)
-    return violin, crit_diff
+
+    if variances.shape[1] == 0:
+        return violin, crit_diff, None, {"display": "none"}
+
+    variances = variances.reindex(columns=[name + VARIANCE_SUFFIX
+                                           for name in fanova_df.columns])
+    errorbars = vis.seed_errorbars(fanova_df, variances.fillna(0))
+    return violin, crit_diff, errorbars, {}
 
 
 layout = dbc.Container([
@@ -36,6 +51,14 @@ layout = dbc.Container([
         ], width={"offset": 2, "size": 8})
     ]),
 
+    dbc.Row([
+        dbc.Col([
+            html.Center(html.H3("Variance Between Seeds",
+                                style={"marginBottom": "20px"})),
+            dcc.Graph(id="seed_errorbars"),
+        ], width={"offset": 2, "size": 8})
+    ], id="seed_errorbars_row", style={"display": "none"}),
+
     dbc.Row([
         dbc.Col([
             html.Center(html.H3("Critical Difference Plot",
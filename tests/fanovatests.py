@@ -1,13 +1,23 @@
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
 import unittest
+from unittest import mock
 import pandas as pd
 import numpy as np
 
 from ConfigSpace import (ConfigurationSpace, CategoricalHyperparameter,
-                         Constant, OrdinalHyperparameter)
+                         Constant, OrdinalHyperparameter,
+                         UniformFloatHyperparameter)
 from ConfigSpace.hyperparameters import NumericalHyperparameter
 from ConfigSpace.hyperparameters.hp_components import ROUND_PLACES
 
 import backend.fanovaservice as fnvs
+from backend.forestanova import NumpyANOVA
 
 # The configspace used to generate data
 # Those labeled 'full' have no missing values
@@ -74,6 +84,12 @@ class FanovaTests(unittest.TestCase):
                    for id, data in imputed.items()}
         return imputed
 
+    def prepare_tasks(self, ids=(0,), **forest):
+        data = {id: self.data[id] for id in ids}
+        imputed, space = fnvs.impute_data(data, fnvs.auto_configspace(data))
+        prepared = fnvs.prepare_data(imputed, space)
+        return prepared, space, fnvs.forest_params('quick', **forest)
+
     def cfg_space_check(self,
                         created: ConfigurationSpace,
                         correct: ConfigurationSpace) -> bool:
@@ -102,6 +118,33 @@ class FanovaTests(unittest.TestCase):
 
         self.cfg_space_check(auto_cfg_space, cfg_space)
 
+    def test_column_stats(self):
+        data = {0: pd.DataFrame({'value': [0.1, 0.2], 'a': [1, 3],
+                                 'b': ['x', 'y'], 'c': [1, 2]}),
+                1: pd.DataFrame({'value': [0.3], 'a': [2.5],
+                                 'b': ['z'], 'c': ['w']})}
+
+        summary = fnvs.summarise_columns(fnvs.column_stats(task_data)
+                                         for task_data in data.values())
+        self.assertEqual(summary['tasks'], 2)
+        self.assertEqual(summary['columns']['a']['kind'], 'float')
+        self.assertEqual(summary['columns']['a']['count'], 3)
+        self.assertListEqual(summary['columns']['b']['unique'],
+                             ['x', 'y', 'z'])
+        self.assertEqual(summary['columns']['c']['kind'], 'mixed')
+
+        # Columns that are not numeric everywhere need the data itself
+        self.assertRaises(ValueError, fnvs.summary_configspace, summary)
+        space = fnvs.summary_configspace(summary, data)
+        self.assertEqual(space['a'].lower, 1.0)
+        self.assertEqual(space['a'].upper, 3.0)
+        self.assertSetEqual(set(space['c'].choices), {1, 2, 'w'})
+
+        # Integers that are missing from a task become floats
+        data[1] = data[1].drop(columns=['a'])
+        space = fnvs.auto_configspace(data)
+        self.assertIsInstance(space['a'], UniformFloatHyperparameter)
+
     def test_filter(self):
         filter_space = ConfigurationSpace({'int': (0, 4),
                                            'float': (1.0, 5.0),
@@ -119,6 +162,26 @@ class FanovaTests(unittest.TestCase):
             self.assertIsInstance(data, pd.DataFrame)
             self.assertTrue(data.equals(correct[id]))
 
+        # Changing one range only evaluates that hyperparameter again
+        masks = fnvs.filter_masks(self.data, filter_space)
+        narrow_space = ConfigurationSpace({'int': (0, 3),
+                                           'float': (1.0, 5.0),
+                                           'cat': ['a', 'c', 'IMPUTE_HPIAD']})
+        narrow_masks = fnvs.filter_masks(self.data, narrow_space, masks)
+        self.assertIs(narrow_masks['cat'], masks['cat'])
+        self.assertIsNot(narrow_masks['int'], masks['int'])
+
+        narrowed = fnvs.filter_data(self.data, narrow_space, masks)
+        for id, data in narrowed.items():
+            self.assertTrue(data.equals(
+                correct[id][(correct[id].int != 4) | correct[id].int.isna()]))
+        self.assertDictEqual(fnvs.filter_counts(self.data, narrow_masks),
+                             {id: len(data) for id, data in narrowed.items()})
+
+        # Tasks without filtered runs are not copied
+        everything = fnvs.filter_data(self.data, cfg_space)
+        self.assertIs(everything[0], self.data[0])
+
     def test_impute(self):
         imputed_data, new_space = fnvs.impute_data(self.data, cfg_space)
 
@@ -139,6 +202,16 @@ class FanovaTests(unittest.TestCase):
 
         # Assert that the new configspace is correct
         self.cfg_space_check(new_space, imp_space)
+
+        # Assert that the precomputed statistics give the same result
+        stats = fnvs.data_stats(self.data)
+        self.assertEqual(stats[0]['int']['nulls'],
+                         self.data[0]['int'].isna().sum())
+        self.assertEqual(stats[0]['full_int']['nulls'], 0)
+        _, stats_space = fnvs.impute_data(self.data, cfg_space, stats)
+        self.assertEqual(stats_space, new_space)
+        self.assertEqual(fnvs.auto_configspace(self.data, stats),
+                         fnvs.auto_configspace(self.data))
         # imputed_data, new_space = fnvs.impute_data(self.data, cfg_space)
 
         # # Check for every dataframe...
@@ -170,10 +243,15 @@ class FanovaTests(unittest.TestCase):
 
     def test_bins(self):
         imputed = self.stub_impute()
+        original = {id: data.copy() for id, data in imputed.items()}
 
         binned, new_cfg = fnvs.bin_numeric(imputed, cfg_space)
         all_binned = pd.concat(binned)
 
+        # Test that the input is left as it was
+        for id, data in imputed.items():
+            pd.testing.assert_frame_equal(data, original[id])
+
         # Test that all hyperparams still exist
         self.assertSetEqual(set(new_cfg.keys()), set(cfg_space.keys()))
 
@@ -187,6 +265,30 @@ class FanovaTests(unittest.TestCase):
             else:
                 self.assertIsInstance(param, type(cfg_space[p_name]))
 
+    def test_quantile_sketch(self):
+        rng = np.random.default_rng(0)
+        tasks = [rng.integers(0, 100, 1000), rng.integers(50, 200, 500)]
+
+        # Few unique values are summarised exactly
+        sketch = fnvs.QuantileSketch(tasks[0]).merge(
+            fnvs.QuantileSketch(tasks[1]))
+        values = np.sort(np.concatenate(tasks))
+        ranks = np.arange(0, len(values), 7)
+        self.assertEqual(sketch.total, len(values))
+        self.assertEqual(sketch.nunique, len(np.unique(values)))
+        np.testing.assert_array_equal(sketch.rank_values(ranks),
+                                      values[ranks])
+
+        # Many unique values give quantiles close in rank
+        tasks = [rng.random(6000), rng.normal(size=6000)]
+        sketch = fnvs.QuantileSketch(tasks[0]).merge(
+            fnvs.QuantileSketch(tasks[1]))
+        values = np.sort(np.concatenate(tasks))
+        found = np.searchsorted(values, sketch.rank_values(ranks))
+        self.assertFalse(sketch.exact)
+        self.assertLess(np.abs(found - ranks).max(),
+                        2 * len(values) / fnvs.SKETCH_SIZE)
+
     def test_prepare(self):
         imputed = self.stub_impute()
         prepared = fnvs.prepare_data(imputed, cfg_space)
@@ -229,6 +331,417 @@ class FanovaTests(unittest.TestCase):
         self.assertGreaterEqual(set(result.keys()), set(run_space.keys()))
         self.assertEqual(len(result) - len(run_space), 3)
 
+    def test_reduce(self):
+        data = pd.DataFrame({'value': [1.0, 3.0, 5.0, 7.0, 9.0],
+                             'a': [1.0, 1.0, 2.0, 2.0, 1.0],
+                             'b': [0.0, 0.0, 0.0, 1.0, 0.0]})
+
+        # Duplicate setups get their mean value and amount of runs
+        reduced = fnvs.reduce_data({0: data})[0]
+        self.assertEqual(len(reduced), 3)
+        self.assertEqual(reduced[fnvs.COUNT_COLUMN].sum(), 5)
+        first = reduced[(reduced.a == 1) & (reduced.b == 0)].iloc[0]
+        self.assertEqual(first.value, 13 / 3)
+        self.assertEqual(first[fnvs.COUNT_COLUMN], 3)
+        pd.testing.assert_frame_equal(fnvs.deduplicate(reduced), reduced)
+
+        # A stratified sample has one run of every range of values
+        runs = pd.DataFrame({'value': np.arange(100.0),
+                             'a': np.arange(100.0) % 7})
+        sample = fnvs.subsample(runs, 10, seed=0)
+        self.assertEqual(len(sample), 10)
+        self.assertListEqual(list(sample.value // 10), list(range(10)))
+        self.assertEqual(len(fnvs.subsample(runs, 10, 'random', seed=0)),
+                         10)
+        self.assertIs(fnvs.subsample(runs, 0), runs)
+        self.assertRaises(ValueError, fnvs.subsample, runs, 10, 'reservoir')
+
+    def test_weights(self):
+        # Every setup of a full grid has a random amount of runs
+        rng = np.random.default_rng(0)
+        grid = pd.MultiIndex.from_product([range(4)] * 3,
+                                          names=['a', 'b', 'c'])
+        setups = grid.to_frame(index=False).astype(float)
+        runs = setups.loc[setups.index.repeat(rng.integers(1, 20, 64))]
+        runs = runs.reset_index(drop=True)
+        runs.insert(0, 'value', 3 * runs.a + runs.b * runs.c
+                    + rng.normal(0, 0.1, len(runs)))
+        space = ConfigurationSpace({name: (0, 3) for name in 'abc'})
+        reduced = fnvs.reduce_data({0: runs})[0]
+        self.assertEqual(len(reduced), 64)
+
+        # Weighted by their runs, the setups give the importances of the
+        # runs, up to the bootstrap samples of the forest
+        forest = fnvs.forest_params('full', n_trees=64)
+        for engine, delta in [('pyrfr', 0.05), ('numpy', 0.02)]:
+            raw = fnvs.run_fanova(runs, space, forest=forest, seed=0,
+                                  engine=engine)
+            weighted = fnvs.run_fanova(reduced, space, forest=forest, seed=0,
+                                       engine=engine)
+            for name in space.keys():
+                self.assertAlmostEqual(raw[name], weighted[name], delta=delta)
+
+        # Sampling deduplicated setups draws runs, for both methods
+        for method in fnvs.SAMPLING_METHODS:
+            sample = fnvs.subsample(reduced, 100, method, seed=0)
+            self.assertEqual(sample[fnvs.COUNT_COLUMN].sum(), 100)
+            self.assertTrue((sample[fnvs.COUNT_COLUMN] <=
+                             reduced.loc[sample.index, fnvs.COUNT_COLUMN])
+                            .all())
+
+        # No more than max_rows runs reach the forest of either engine
+        rows = []
+
+        def recording(engine):
+            def fit(X, Y, **params):
+                weights = params.get('sample_weight')
+                rows.append(len(X) if weights is None else weights.sum())
+                return engine(X, Y, **params)
+            return fit
+
+        forest = fnvs.forest_params('quick', max_rows=100)
+        with mock.patch.dict(fnvs.ENGINES,
+                             {name: recording(engine)
+                              for name, engine in fnvs.ENGINES.items()}):
+            for engine in fnvs.ENGINES:
+                fnvs.run_fanova(reduced, space, forest=forest, seed=0,
+                                engine=engine)
+        self.assertListEqual(rows, [100] * len(fnvs.ENGINES))
+
+    def test_forest(self):
+        quick = fnvs.forest_params('quick', n_trees=2, max_depth=None)
+        self.assertEqual(quick['n_trees'], 2)
+        self.assertEqual(quick['max_depth'],
+                         fnvs.FOREST_PRESETS['quick']['max_depth'])
+        with self.assertRaises(ValueError):
+            fnvs.forest_params(n_tree=2)
+
+        prepared, space, forest = self.prepare_tasks(max_rows=200)
+        prepared = prepared[0]
+
+        # The same seed gives the same forest, also when subsampling rows
+        result = fnvs.run_fanova(prepared, space, forest=forest, seed=1)
+        self.assertSetEqual(set(result.keys()), set(space.keys()))
+        self.assertEqual(result, fnvs.run_fanova(prepared, space,
+                                                 forest=forest, seed=1))
+
+    def test_engines(self):
+        rng = np.random.default_rng(0)
+        space = ConfigurationSpace({'a': (0.0, 1.0), 'b': (0.0, 1.0),
+                                    'c': (0.0, 1.0)})
+        X = rng.random((400, 3))
+        data = pd.DataFrame(X, columns=['a', 'b', 'c'])
+        data.insert(0, 'value', 4 * X[:, 0] + 2 * X[:, 1] + X[:, 0] * X[:, 1]
+                    + rng.normal(0, 0.01, 400))
+
+        pyrfr = fnvs.run_fanova(data, space, seed=0)
+        numpy = fnvs.run_fanova(data, space, seed=0, engine='numpy',
+                                n_pairs=1)
+
+        # Both engines find the same importances, up to their forests
+        for name in space.keys():
+            self.assertAlmostEqual(pyrfr[name], numpy[name], delta=0.05)
+        self.assertIn('a_-_b', numpy)
+
+        # The importances of a model are fractions of its total variance
+        model = NumpyANOVA(data[['a', 'b', 'c']], data.value.to_numpy(),
+                           space, n_trees=4, seed=0)
+        importance = model.quantify_importance((0, 1, 2))
+        self.assertEqual(len(importance), 7)
+        self.assertAlmostEqual(
+            sum(score['individual importance']
+                for score in importance.values()), 1, delta=0.01)
+
+        self.assertRaises(ValueError, fnvs.run_fanova, data, space,
+                          engine='unknown')
+
+    def test_pruned_pairs(self):
+        self.assertEqual(fnvs.pair_candidates(1, 10),
+                         2 + fnvs.PAIR_CANDIDATE_MARGIN)
+        self.assertEqual(fnvs.pair_candidates(6, 10),
+                         4 + fnvs.PAIR_CANDIDATE_MARGIN)
+        self.assertEqual(fnvs.pair_candidates(6, 3), 3)
+
+        prepared, space, forest = self.prepare_tasks()
+        prepared = prepared[0]
+
+        # Pairs only consist of the most important hyperparameters
+        result = fnvs.run_fanova(prepared, space, 1, forest, seed=0)
+        individual = pd.Series({name: result[name] for name in space})
+        top = set(individual.nlargest(fnvs.pair_candidates(1, len(space)))
+                  .index)
+        pairs = [name for name in result if name not in space]
+        self.assertEqual(len(pairs), 1)
+        self.assertLessEqual(set(pairs[0].split('_-_')), top)
+
+        # Pairs are named in the order of the configspace, also when a
+        # later hyperparameter is more important
+        rng = np.random.default_rng(0)
+        names = [f'x{i}' for i in range(6)]
+        grid = pd.DataFrame(rng.integers(0, 4, (400, 6)).astype(float),
+                            columns=names)
+        grid['value'] = 4 * grid['x5'] + 2 * grid['x4'] * grid['x3']
+        grid_space = ConfigurationSpace({name: (0, 3) for name in names})
+        result = fnvs.run_fanova(grid, grid_space, 3, forest, seed=0)
+        order = {name: i for i, name in enumerate(names)}
+        pairs = [name.split('_-_') for name in result if name not in names]
+        self.assertEqual(len(pairs), 3)
+        for first, second in pairs:
+            self.assertLess(order[first], order[second])
+
+        # The exhaustive search considers all pairs
+        total = len(space) * (len(space) - 1) // 2
+        result = fnvs.run_fanova(prepared, space, total, forest, seed=0,
+                                 prune_pairs=False)
+        self.assertEqual(len(result) - len(space), total)
+
+    def test_triplets(self):
+        prepared, space, forest = self.prepare_tasks()
+        prepared = prepared[0]
+
+        result = fnvs.run_fanova(prepared, space, forest=forest, seed=0,
+                                 n_triplets=2, triplet_evaluations=3)
+        triplets = [name for name in result if name.count('_-_') == 2]
+        self.assertEqual(len(triplets), 2)
+        self.assertEqual(len(result), len(space) + 2)
+        for triplet in triplets:
+            self.assertLessEqual(set(triplet.split('_-_')), set(space))
+
+        # The time budget stops the search
+        result = fnvs.run_fanova(prepared, space, forest=forest, seed=0,
+                                 n_triplets=2, triplet_seconds=1e-9)
+        self.assertEqual(len(result), len(space))
+
+    def test_bootstrap(self):
+        prepared, space, forest = self.prepare_tasks(n_trees=2)
+        prepared = prepared[0]
+
+        # With a large tolerance the second check already stops, before
+        # the remaining resamples are drawn
+        step = fnvs.BOOTSTRAP_STEP
+        with mock.patch.object(fnvs, '_resample',
+                               wraps=fnvs._resample) as resample:
+            intervals = fnvs.bootstrap_fanova(prepared, space, 3 * step,
+                                              tolerance=1, n_workers=1,
+                                              seed=0, forest=forest)
+        self.assertEqual(intervals.attrs['replicates'], 2 * step)
+        self.assertEqual(resample.call_count, 2 * step)
+        self.assertSetEqual(set(intervals.index), set(space.keys()))
+        self.assertTrue((intervals['lower'] <= intervals['mean']).all())
+        self.assertTrue((intervals['mean'] <= intervals['upper']).all())
+
+        # Without stopping early, all replicates are used
+        intervals = fnvs.bootstrap_fanova(prepared, space, step + 1,
+                                          tolerance=-1, n_workers=1, seed=0,
+                                          forest=forest)
+        self.assertEqual(intervals.attrs['replicates'], step + 1)
+
+        # Deduplicated setups are drawn in proportion to their runs
+        setups = pd.DataFrame({'value': [0.0, 1.0], 'a': [0.0, 1.0],
+                               fnvs.COUNT_COLUMN: [999, 1]})
+        sample = fnvs._resample(setups, np.random.default_rng(0))
+        self.assertEqual(sample[fnvs.COUNT_COLUMN].sum(), 1000)
+        self.assertGreater(sample[fnvs.COUNT_COLUMN].iloc[0], 950)
+
+    def test_run_tasks(self):
+        prepared, space, forest = self.prepare_tasks([2, 0, 1])
+
+        done = []
+        results = fnvs.run_fanova_tasks(prepared, space, n_workers=2,
+                                        forest=forest,
+                                        progress=(lambda i, n:
+                                                  done.append((i, n))))
+
+        # Results are in the order of the data, progress in completion order
+        self.assertEqual(list(results.keys()), [2, 0, 1])
+        self.assertEqual(done, [(1, 3), (2, 3), (3, 3)])
+        for result in results.values():
+            self.assertSetEqual(set(result.keys()), set(space.keys()))
+
+    def test_pool_main(self):
+        # Pool workers do not run the main module of the app again
+        script = textwrap.dedent('''
+            import numpy as np
+            import pandas as pd
+            from ConfigSpace import ConfigurationSpace
+            import backend.fanovaservice as fnvs
+
+            print('main', flush=True)
+            if __name__ == '__main__':
+                rng = np.random.default_rng(0)
+                data = {task: pd.DataFrame(rng.random((50, 3)),
+                                           columns=['value', 'a', 'b'])
+                        for task in range(2)}
+                space = ConfigurationSpace({'a': (0.0, 1.0),
+                                            'b': (0.0, 1.0)})
+                results = fnvs.run_fanova_tasks(data, space, n_workers=2)
+                print(len(results), flush=True)
+            ''')
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'main.py')
+            with open(path, 'w') as file:
+                file.write(script)
+            output = subprocess.run([sys.executable, path], check=True,
+                                    capture_output=True, text=True,
+                                    env={**os.environ,
+                                         'PYTHONPATH': os.getcwd()})
+        self.assertListEqual(output.stdout.split(), ['main', '2'])
+
+    def test_seeds(self):
+        prepared, space, forest = self.prepare_tasks()
+
+        results = fnvs.run_fanova_tasks(prepared, space, n_workers=1,
+                                        n_seeds=2, forest=forest, seed=0)
+
+        # Every importance gets the variance of its seeds
+        expected = set(space.keys())
+        expected |= {name + fnvs.VARIANCE_SUFFIX for name in space.keys()}
+        self.assertSetEqual(set(results[0].keys()), expected)
+        for name in space.keys():
+            self.assertGreaterEqual(results[0][name + fnvs.VARIANCE_SUFFIX],
+                                    0)
+
+        # A single seed is passed through unchanged
+        single = {'a': 0.5}
+        self.assertIs(fnvs.combine_seeds([single]), single)
+
+    def test_result_cache(self):
+        class Cache(dict):
+            def set(self, key, value):
+                self[key] = value
+
+        prepared, space, forest = self.prepare_tasks([0, 1])
+
+        # Keys only depend on the arguments of run_fanova
+        key = fnvs.fanova_key(prepared[0], space, forest=forest)
+        self.assertEqual(key, fnvs.fanova_key(prepared[0].copy(), space,
+                                              forest=forest))
+        self.assertNotEqual(key, fnvs.fanova_key(prepared[1], space,
+                                                 forest=forest))
+        self.assertNotEqual(key, fnvs.fanova_key(prepared[0], space, n_pairs=1,
+                                                 forest=forest))
+        self.assertNotEqual(key, fnvs.fanova_key(prepared[0], space))
+
+        cache = Cache()
+        fnvs.configure_result_cache(cache)
+        try:
+            first = fnvs.run_fanova_tasks(prepared, space, forest=forest,
+                                          n_workers=1)
+            self.assertEqual(len(cache), 2)
+
+            # Without a seed the results would differ if they were not cached
+            second = fnvs.run_fanova_tasks(prepared, space, forest=forest,
+                                           n_workers=1)
+            self.assertEqual(first, second)
+
+            # Seeds drawn at random for a seed ensemble are not cached
+            fnvs.run_fanova_tasks(prepared, space, forest=forest,
+                                  n_workers=1, n_seeds=2)
+            self.assertEqual(len(cache), 2)
+            fnvs.run_fanova_tasks(prepared, space, forest=forest,
+                                  n_workers=1, n_seeds=2, seed=0)
+            self.assertEqual(len(cache), 6)
+        finally:
+            fnvs.configure_result_cache(None)
+
+    def test_celery_group(self):
+        # Stand-ins for Celery and Redis that run the group eagerly
+        class Redis(dict):
+            def pipeline(self):
+                return contextlib.nullcontext(self)
+
+            def execute(self):
+                pass
+
+            def set(self, key, value, ex=None):
+                self[key] = value
+
+            def delete(self, *keys):
+                for key in keys:
+                    self.pop(key)
+
+        class Signature:
+            def __init__(self, args):
+                self.args = args
+
+        class Task:
+            run = staticmethod(fnvs._run_fanova_reference)
+
+            def __init__(self, func):
+                pass
+
+            def s(self, *args):
+                # Arguments are sent to the workers as JSON
+                return Signature(json.loads(json.dumps(args)))
+
+        def group(signatures):
+            results = [Task.run(*signature.args) for signature in signatures]
+            result = mock.MagicMock()
+            result.ready.return_value = True
+            result.get.return_value = results
+            result.apply_async.return_value = result
+            return result
+
+        celery_app = mock.MagicMock()
+        celery_app.task.return_value = Task
+        signals = mock.MagicMock()
+        modules = {'celery': mock.MagicMock(group=group),
+                   'celery.signals': signals}
+
+        class Cache(dict):
+            def set(self, key, value):
+                self[key] = value
+
+        prepared, space, forest = self.prepare_tasks([2, 0, 1])
+        redis, cache = Redis(), Cache()
+        with mock.patch.dict(sys.modules, modules):
+            fnvs.configure_celery(celery_app, redis)
+            fnvs.configure_result_cache(cache)
+            try:
+                self.assertTrue(fnvs.celery_enabled())
+                results = fnvs.run_fanova_group(prepared, space, seed=0,
+                                                forest=forest)
+
+                # Results are in the order of the data, stored data is removed
+                self.assertEqual(list(results.keys()), [2, 0, 1])
+                self.assertEqual(len(redis), 0)
+                self.assertEqual(len(cache), 3)
+                for task, result in results.items():
+                    self.assertEqual(result, fnvs.run_fanova(prepared[task],
+                                                             space, seed=0,
+                                                             forest=forest))
+
+                # Cached results are not sent to the workers again
+                with mock.patch.object(fnvs, '_run_stored_fanova') as stored:
+                    self.assertEqual(fnvs.run_fanova_group(prepared, space,
+                                                           seed=0,
+                                                           forest=forest),
+                                     results)
+                    stored.s.assert_not_called()
+            finally:
+                fnvs._celery_app = fnvs._redis = None
+                fnvs.configure_result_cache(None)
+
+        # The children of a starting worker split its cores between them
+        handler = signals.worker_init.connect.call_args.args[0]
+        with mock.patch.object(fnvs, '_limit_threads') as limit, \
+                mock.patch.object(fnvs.os, 'cpu_count', return_value=8):
+            handler(sender=mock.MagicMock(concurrency=2))
+            limit.assert_called_once_with(4)
+
+    def test_analyse_task(self):
+        filter_space = ConfigurationSpace({'cat': ['a', 'c']})
+        result = fnvs.analyse_task(self.data[0], filter_space)
+        self.assertIsNotNone(result)
+
+        # All non-constant hyperparameters are analysed, and nothing else
+        self.assertSetEqual(set(result.keys()),
+                            set(cfg_space.keys()) - {'full_const'})
+
+        # Too few runs after filtering gives no result
+        self.assertIsNone(fnvs.analyse_task(self.data[0], filter_space,
+                                            len(self.data[0])))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import pandas as pd
+
+import backend.flowsearch as search
+
+flows = pd.DataFrame({'full_name': ['sklearn.svm.SVC(1)',
+                                    'sklearn.pipeline.Pipeline(svc=SVC)',
+                                    'mlr.classif.ranger',
+                                    'weka.J48',
+                                    'sklearn.svm.SVC(2)']},
+                     index=pd.Index([5, 12, 123, 1234, 2345], name='id'))
+
+
+class FlowSearchTests(unittest.TestCase):
+
+    def test_search(self):
+        def ids(query):
+            return [id for id, _ in search.search_flows(flows, query)]
+
+        # tokens match case insensitively, shortest names first,
+        # and newer flows first among names of the same length
+        self.assertEqual(ids('svc'), [2345, 5, 12])
+        self.assertEqual(ids('sklearn SVC(1'), [5])
+        # every token should match
+        self.assertEqual(ids('sklearn.ranger'), [])
+        self.assertEqual(ids('ranger'), [123])
+        # numeric tokens match the id, and exact ids come first
+        self.assertEqual(ids('123'), [123, 1234])
+        self.assertEqual(ids('234 weka'), [1234])
+        # tokens that are too short are ignored
+        self.assertEqual(ids('sv'), [])
+        self.assertEqual(ids('mlr.x'), [123])
+        self.assertEqual(ids('xyz'), [])
+        self.assertEqual(len(search.search_flows(flows, 'svc', limit=2)), 2)
+
+    def test_index_cache(self):
+        index = search.flow_index(flows)
+        self.assertIs(search.flow_index(flows.copy()), index)
+
+        # the index is rebuilt when the catalog changes
+        new = pd.concat([flows, pd.DataFrame({'full_name': ['weka.SMO']},
+                                             index=[3456])])
+        self.assertIsNot(search.flow_index(new), index)
+        self.assertEqual([id for id, _ in search.search_flows(new, 'smo')],
+                         [3456])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,8 @@
+import os
+import tempfile
 import unittest
+from unittest import mock
+import numpy as np
 import pandas as pd
 
 import backend.openmlfetcher as omlf
@@ -56,6 +60,200 @@ class OpenMLTests(unittest.TestCase):
         self.assertIsInstance(data, pd.DataFrame)
         self.assertNotIn(object, set(data.dtypes))
 
+    def test_runs_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            data = omlf.fetch_runs(flow_id, openml100[0], max_runs,
+                                   cache_dir=cache_dir)
+            cached = omlf.fetch_runs(flow_id, openml100[0], max_runs,
+                                     cache_dir=cache_dir)
+            self.assertTrue(data.equals(cached))
+
+            # Fewer runs can be served from the same cached runs
+            fewer = omlf.fetch_runs(flow_id, openml100[0], max_runs // 2,
+                                    cache_dir=cache_dir)
+            self.assertTrue(data.head(max_runs // 2).equals(fewer))
+
+    def test_suite_runs(self):
+        tasks = openml100[:4] + [1000000]
+        progress = []
+        data = omlf.fetch_suite_runs(flow_id, tasks, max_runs,
+                                     max_workers=2,
+                                     progress=(lambda done, total:
+                                               progress.append(
+                                                   (done, total))))
+        self.assertIsInstance(data, dict)
+        self.assertLessEqual(set(data.keys()), set(openml100[:4]))
+        for task, task_data in data.items():
+            self.assertIsInstance(task_data, pd.DataFrame)
+            self.assertLessEqual(len(task_data), max_runs)
+
+            # Each task gets the same runs as when fetched on its own
+            single = omlf.fetch_runs(flow_id, task, max_runs)
+            self.assertTrue(task_data.sort_index(axis=1)
+                            .equals(single.sort_index(axis=1)))
+
+        # Every task reports progress, including the one without runs
+        self.assertListEqual(progress[:len(tasks)],
+                             [(i, len(tasks))
+                              for i in range(1, len(tasks) + 1)])
+
+    def test_suite_runs_refresh(self):
+        # A stub of the OpenML server, which only ever adds runs
+        server = pd.DataFrame({'run_id': [1, 2, 3, 4],
+                               'task_id': 1,
+                               'setup_id': [10, 11, 10, 12],
+                               'value': [0.1, 0.2, 0.3, 0.4]})
+        requested = []
+
+        def list_evaluations(function, tasks, flows, output_format, size):
+            evals = server[server.task_id.isin(tasks)]
+            return evals if size is None else evals.head(size)
+
+        def list_setups(setup, output_format):
+            requested.append(list(setup))
+            return pd.DataFrame({'parameters': [
+                {0: {'parameter_name': 'C', 'value': str(id)}}
+                for id in setup]}, index=setup)
+
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(omlf.evaluations, 'list_evaluations',
+                                  list_evaluations), \
+                mock.patch.object(omlf.setups, 'list_setups', list_setups):
+            data = omlf.fetch_suite_runs(flow_id, [1], max_runs=10,
+                                         cache_dir=cache_dir)
+            self.assertListEqual(list(data[1].index), [1, 2, 3, 4])
+            self.assertListEqual(requested, [[10, 11, 12]])
+
+            # New runs with a known and an unknown setup, and a run below
+            # the highest cached run, which can not be new
+            server = pd.concat([server, pd.DataFrame({
+                'run_id': [0, 5, 6], 'task_id': 1,
+                'setup_id': [14, 11, 13], 'value': [0.0, 0.5, 0.6]})])
+            os.remove(os.path.join(cache_dir, f'f{flow_id}_setups.parquet'))
+            requested.clear()
+
+            # The stale complete entry only gets the newer runs, and only
+            # the setups that are not in the cached runs are collected
+            with mock.patch.object(omlf, 'RUN_CACHE_TTL', -1):
+                data = omlf.fetch_suite_runs(flow_id, [1],
+                                             cache_dir=cache_dir)
+            self.assertListEqual(requested, [[13]])
+            self.assertListEqual(list(data[1].index), [1, 2, 3, 4, 5, 6])
+            self.assertListEqual(list(data[1].C), ['10', '11', '10', '12',
+                                                   '11', '13'])
+
+            # A larger limit than the cached one is refreshed up to that
+            # limit, here without any, and stored as the new limit
+            server = pd.concat([server, pd.DataFrame({
+                'run_id': range(7, 31), 'task_id': 1, 'setup_id': 11,
+                'value': 0.7})])
+            with mock.patch.object(omlf, 'RUN_CACHE_TTL', -1):
+                data = omlf.fetch_suite_runs(flow_id, [1],
+                                             cache_dir=cache_dir)
+            self.assertListEqual(list(data[1].index), list(range(1, 31)))
+            path = omlf._run_cache_path(cache_dir, flow_id, 1,
+                                        'predictive_accuracy')
+            self.assertIsNone(omlf._read_run_cache(path)[1]['max_runs'])
+
+    def test_suite_runs_progress(self):
+        # A stub of the OpenML server with three tasks, each with its own
+        # setups, which are collected in batches of 4
+        server = pd.DataFrame({'run_id': range(30),
+                               'task_id': np.repeat([1, 2, 3], 10),
+                               'setup_id': range(100, 130),
+                               'value': 0.5})
+
+        def list_evaluations(function, tasks, flows, output_format, size):
+            return server[server.task_id.isin(tasks)].head(size)
+
+        def list_setups(setup, output_format):
+            return pd.DataFrame({'parameters': [
+                {0: {'parameter_name': 'C', 'value': str(id)}}
+                for id in setup]}, index=setup)
+
+        done = []
+        with mock.patch.object(omlf.evaluations, 'list_evaluations',
+                               list_evaluations), \
+                mock.patch.object(omlf.setups, 'list_setups', list_setups), \
+                mock.patch.object(omlf, 'ID_LIST_LENGTH', 16):
+            omlf.fetch_suite_runs(flow_id, [1, 2, 3], max_runs=10,
+                                  max_workers=1,
+                                  progress=(lambda i, n: done.append((i, n))))
+
+        # One total over listing and collecting, which is only counted up
+        self.assertSetEqual({total for _, total in done}, {6})
+        steps = [step for step, _ in done]
+        self.assertListEqual(steps, sorted(steps))
+        self.assertEqual(steps[0], 1)
+        self.assertEqual(steps[-1], 6)
+        self.assertGreater(len(done), 6)
+
+    def test_setup_batch(self):
+        calls = []
+
+        def list_setups(setup, output_format, fail=2):
+            calls.append(list(setup))
+            if len(calls) <= fail:
+                raise OSError('Request failed')
+            return pd.DataFrame({'parameters': [None] * len(setup)},
+                                index=setup)
+
+        # A failed batch is retried in halves
+        with mock.patch.object(omlf.setups, 'list_setups', list_setups):
+            params = omlf._list_setup_batch([1, 2, 3, 4], 3)
+        self.assertListEqual(list(params.index), [1, 2, 3, 4])
+        self.assertListEqual(calls, [[1, 2, 3, 4], [1, 2], [1], [2],
+                                     [3, 4]])
+
+        # A single setup is retried as is, until no attempts are left
+        calls.clear()
+        with mock.patch.object(omlf.setups, 'list_setups', list_setups), \
+                mock.patch.object(omlf, 'sleep'):
+            self.assertListEqual(list(omlf._list_setup_batch([5], 3).index),
+                                 [5])
+            self.assertListEqual(calls, [[5], [5], [5]])
+            calls.clear()
+            self.assertRaises(OSError, omlf._list_setup_batch, [5], 2)
+
+    def test_normalise_parameters(self):
+        params = pd.Series({1: {10: {'parameter_name': 'C', 'value': '1'},
+                                11: {'parameter_name': 'k', 'value': 'a'}},
+                            2: {11: {'parameter_name': 'k', 'value': 'b'}},
+                            3: None})
+        data = omlf.normalise_parameters(params)
+
+        # One row per setup, one column per parameter in order
+        self.assertListEqual(list(data.index), [1, 2, 3])
+        self.assertListEqual(list(data.columns), ['C', 'k'])
+        self.assertListEqual(list(data.k.iloc[:2]), ['a', 'b'])
+        self.assertEqual(data.C[1], '1')
+        self.assertTrue(data.C.iloc[1:].isna().all())
+        self.assertTrue(data.loc[3].isna().all())
+
+    def test_coerce_types(self):
+        raw = pd.DataFrame({'value': ['0.1', '0.2', '0.3'],
+                            'int': ['1', '2', '300'],
+                            'half': ['0.5', None, '2'],
+                            'cat': ['"rbf"', None, '"poly"'],
+                            'mixed': ['1', 'null', '2']})
+        data = omlf.coerce_types(raw)
+
+        # Numbers are kept exactly, in the smallest dtype possible
+        self.assertEqual(data.value.dtype, np.float64)
+        self.assertEqual(data.int.dtype, np.int16)
+        self.assertEqual(data.half.dtype, np.float32)
+        self.assertEqual(data.mixed.dtype, np.float32)
+        for col in ['value', 'int', 'half', 'mixed']:
+            correct = pd.to_numeric(raw[col], errors='coerce')
+            self.assertTrue(((data[col] == correct)
+                             | correct.isna()).all())
+            self.assertTrue((data[col].isna() == correct.isna()).all())
+
+        # Strings become categories
+        self.assertIsInstance(data.cat.dtype, pd.CategoricalDtype)
+        self.assertSetEqual(set(data.cat.cat.categories), {'"rbf"', '"poly"'})
+        self.assertTrue(data.cat.isna()[1])
+
     def test_runs_neg(self):
         data = omlf.fetch_runs(flow_id, 1000000, max_runs)
         self.assertIsNone(data)